@@ -8,6 +8,76 @@ class Config:
     DB_NAME = os.getenv("DB_NAME", "marketing_assistant")
     PORT = int(os.getenv("PORT", 8000))  # Changed default to 8000
 
+    # Similarity model: "blockwise" keeps TF-IDF sparse, "dense" is the legacy path
+    SIMILARITY_VECTOR_MODE = os.getenv("SIMILARITY_VECTOR_MODE", "blockwise")
+
+    # Nearest-neighbour index: "ivf" (approximate) or "exact" (brute force).
+    # Catalogs smaller than SIMILARITY_INDEX_MIN_PRODUCTS always use exact search.
+    SIMILARITY_INDEX = os.getenv("SIMILARITY_INDEX", "ivf")
+    SIMILARITY_INDEX_MIN_PRODUCTS = int(os.getenv("SIMILARITY_INDEX_MIN_PRODUCTS", 10000))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+
+    # "int8" adds a scalar-quantized copy for the first scoring pass; the best
+    # k * RERANK_FACTOR candidates are then re-scored exactly in float32
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+    RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", 4))
+
+    # Neighbours precomputed per product for lookups by catalog id (0 skips building the graph)
+    KNN_GRAPH_NEIGHBORS = int(os.getenv("KNN_GRAPH_NEIGHBORS", 20))
+
+    # Inference thread pool: worker threads and how many requests may wait for one
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 4))
+    INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", 32))
+
+    # Query embedding micro-batching: flush after this many texts or milliseconds
+    ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", 32))
+    ENCODER_MAX_WAIT_MS = float(os.getenv("ENCODER_MAX_WAIT_MS", 5))
+
+    # Cache of full marketing-strategy responses
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 600))
+
+    # Feature extraction: products per nlp.pipe / bulk_write batch and spaCy worker processes
+    FEATURE_BATCH_SIZE = int(os.getenv("FEATURE_BATCH_SIZE", 500))
+    FEATURE_PROCESSES = int(os.getenv("FEATURE_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
+
+    # CSV ingestion: Arrow block bytes (rows per chunk without pyarrow) and parallel Mongo writer threads
+    DATA_LOAD_BLOCK_SIZE = int(os.getenv("DATA_LOAD_BLOCK_SIZE", 8 * 1024 * 1024))
+    DATA_LOAD_CHUNK_SIZE = int(os.getenv("DATA_LOAD_CHUNK_SIZE", 20000))
+    DATA_LOAD_WRITERS = int(os.getenv("DATA_LOAD_WRITERS", 4))
+
+    # Trained model artifacts are persisted here and reused on startup
+    MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+    # Content-addressed embedding cache; set EMBEDDING_CACHE_DIR="" to keep it in memory only.
+    # One process writes the directory; MODEL_ROLE=worker servers only read it
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 50000))
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(MODEL_DIR, "embedding_cache"))
+    # Disk rows per cache namespace before it is compacted to its newest half (0 = unbounded)
+    EMBEDDING_CACHE_DISK_ROWS = int(os.getenv("EMBEDDING_CACHE_DISK_ROWS", 1000000))
+
+    # Training reads a columnar catalog snapshot ("snapshot") or queries Mongo directly ("mongo")
+    TRAINING_SOURCE = os.getenv("TRAINING_SOURCE", "snapshot")
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(MODEL_DIR, "snapshots"))
+    TRAINING_BATCH_SIZE = int(os.getenv("TRAINING_BATCH_SIZE", 2000))
+
+    # "auto" switches to streaming out-of-core training from OUT_OF_CORE_MIN_PRODUCTS products on
+    TRAINING_MODE = os.getenv("TRAINING_MODE", "auto")
+    OUT_OF_CORE_MIN_PRODUCTS = int(os.getenv("OUT_OF_CORE_MIN_PRODUCTS", 500000))
+    OUT_OF_CORE_HASH_FEATURES = int(os.getenv("OUT_OF_CORE_HASH_FEATURES", 2 ** 18))
+
+    # add_products/remove_products trigger a full retrain once changes exceed this share of the catalog
+    INCREMENTAL_REFIT_THRESHOLD = float(os.getenv("INCREMENTAL_REFIT_THRESHOLD", 0.2))
+    # Seconds between checks for products added or changed in Mongo since the last fit (0 disables)
+    CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", 30))
+    # Incremental changes are saved at most this often; later ones wait for the next save
+    INCREMENTAL_SAVE_SECONDS = float(os.getenv("INCREMENTAL_SAVE_SECONDS", 60))
+
+    # "standalone" trains in-process; with several server workers run them as "worker" (map the
+    # published artifacts read-only, never train) next to one `python src/model_publisher.py`
+    MODEL_ROLE = os.getenv("MODEL_ROLE", "standalone")
+    MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", 10))
+
 # For backward compatibility
 MONGO_URI = Config.MONGO_URI
 DB_NAME = Config.DB_NAME
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
@@ -11,6 +11,10 @@ import time
 
 from config import Config
 from src.recommender import AdvancedMarketingRecommender, IntelligentScriptGenerator, MarketingScriptRecommender
+from src.inference_pool import InferenceExecutor, InferenceQueueFull
+from src.response_cache import ResponseCache, request_key
+from src.model_trainer import BackgroundTrainer
+from src import model_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -46,9 +50,22 @@ app.add_middleware(
 # Global instances
 recommender = None
 script_generator = None
+trainer = None
 models_loading = False
 models_loaded = False
 
+# Bounded pool that keeps inference and blocking DB calls off the event loop
+inference_executor = InferenceExecutor(
+    max_workers=Config.INFERENCE_WORKERS,
+    queue_depth=Config.INFERENCE_QUEUE_DEPTH
+)
+
+# Full strategy responses, keyed by normalized request and model version
+response_cache = ResponseCache(
+    max_items=Config.RESPONSE_CACHE_SIZE,
+    ttl_seconds=Config.RESPONSE_CACHE_TTL
+)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize ML models on startup in background"""
@@ -60,28 +77,77 @@ async def startup_event():
     # Run model loading in background to avoid blocking startup
     asyncio.create_task(initialize_models())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    inference_executor.shutdown()
+    if recommender:
+        recommender.query_encoder.close()
+    if recommender and not recommender.read_only:
+        # Incremental changes still waiting for their batched save
+        await asyncio.to_thread(recommender.flush_incremental_changes)
+        recommender.embedding_cache.flush()
+        recommender.query_cache.flush()
+
 async def initialize_models():
-    """Initialize ML models asynchronously"""
-    global recommender, script_generator, models_loading, models_loaded
+    """Initialize ML models asynchronously
+    
+    Saved artifacts are served right away, even if the catalog changed since;
+    the next snapshot then trains in the background and is swapped in when
+    ready. Only a first start without artifacts waits for training.
+    """
+    global recommender, script_generator, trainer, models_loading, models_loaded
     
     try:
         logger.info("🔄 Loading BrandWise AI Models...")
         
-        # Initialize the advanced recommender
-        recommender = AdvancedMarketingRecommender()
+        # Initialize the advanced recommender (loads MiniLM and spaCy, so keep it off the loop)
+        recommender = await asyncio.to_thread(AdvancedMarketingRecommender)
+        
+        # Cached strategies are only valid for the model that produced them
+        recommender.version_listeners.append(lambda version: response_cache.clear())
+        
+        if recommender.read_only:
+            # Worker mode: map what the trainer process publishes, never train here
+            logger.info("🎯 Mapping models published by the trainer process...")
+            while recommender.snapshot is None:
+                await asyncio.to_thread(recommender.load_saved_models)
+                if recommender.snapshot is None:
+                    await asyncio.sleep(Config.MODEL_POLL_SECONDS)
+            
+            script_generator = IntelligentScriptGenerator(recommender)
+            models_loaded = True
+            models_loading = False
+            asyncio.create_task(watch_published_models())
+            logger.info("✅ AI Models mapped from the published snapshot!")
+            return
+        
+        trainer = BackgroundTrainer(recommender)
         
-        # Train models (this might take some time)
-        logger.info("🎯 Training ML models with your marketing data...")
-        success = recommender.train_models()
+        logger.info("🎯 Loading saved ML models...")
+        fresh = await asyncio.to_thread(recommender.load_saved_models)
         
-        if success:
-            # Initialize script generator
+        if recommender.snapshot is not None:
             script_generator = IntelligentScriptGenerator(recommender)
             models_loaded = True
-            logger.info("✅ AI Models initialized successfully!")
-        else:
-            logger.warning("⚠️  Models loaded with fallback mode")
-            models_loaded = True  # Still mark as loaded for basic functionality
+            models_loading = False
+            logger.info("✅ AI Models initialized from saved artifacts!")
+        
+        if Config.CATALOG_POLL_SECONDS > 0:
+            asyncio.create_task(watch_catalog_changes())
+        
+        if not fresh:
+            logger.info("🔄 Catalog changed or no saved models, training in the background...")
+            trainer.start("startup")
+            
+            if recommender.snapshot is None:
+                # Nothing to serve yet, so requests wait for the first snapshot
+                await asyncio.to_thread(trainer.wait)
+                script_generator = IntelligentScriptGenerator(recommender)
+                models_loaded = True
+                if trainer.status()["state"] == "succeeded":
+                    logger.info("✅ AI Models initialized successfully!")
+                else:
+                    logger.warning("⚠️  Models loaded with fallback mode")
         
         models_loading = False
         
@@ -91,9 +157,10 @@ async def initialize_models():
         # Fallback to basic functionality
         try:
             logger.info("🔄 Falling back to basic recommender...")
-            recommender = AdvancedMarketingRecommender()
+            recommender = await asyncio.to_thread(AdvancedMarketingRecommender)
             recommender.models_trained = True  # Force mark as trained
             script_generator = IntelligentScriptGenerator(recommender)
+            trainer = BackgroundTrainer(recommender)
             models_loaded = True
             logger.info("✅ Basic recommender loaded as fallback")
         except Exception as fallback_error:
@@ -102,6 +169,39 @@ async def initialize_models():
             script_generator = None
             models_loaded = False
 
+async def watch_published_models():
+    """Swap in each new snapshot the trainer process publishes (worker mode)"""
+    while True:
+        await asyncio.sleep(Config.MODEL_POLL_SECONDS)
+        try:
+            await asyncio.to_thread(recommender.reload_published_models)
+        except Exception as e:
+            logger.error(f"❌ Could not load published models: {e}")
+
+async def watch_catalog_changes():
+    """Index products written to Mongo since the last fit without a full retrain (standalone mode)"""
+    while True:
+        await asyncio.sleep(Config.CATALOG_POLL_SECONDS)
+        if trainer.is_running():
+            # The retrain reads the catalog anyway
+            continue
+        try:
+            await asyncio.to_thread(recommender.sync_catalog_changes)
+            await asyncio.to_thread(recommender.flush_incremental_changes, False)
+        except Exception as e:
+            logger.error(f"❌ Could not sync catalog changes: {e}")
+
+def training_status() -> Optional[Dict[str, Any]]:
+    """Retrain progress, or the forwarded request state in worker mode"""
+    if trainer:
+        return trainer.status()
+    if recommender and recommender.read_only:
+        return {
+            "state": "requested" if model_store.retrain_requested() else "delegated",
+            "serving_version": recommender.artifact_version
+        }
+    return None
+
 # MongoDB connection
 try:
     client = MongoClient(Config.MONGO_URI)
@@ -115,12 +215,24 @@ except Exception as e:
     db_connected = False
 
 # Pydantic Models
+class SimilarityFilters(BaseModel):
+    category: Optional[str] = None
+    brand: Optional[str] = None
+    target_audience: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class ProductSyncRequest(BaseModel):
+    product_ids: List[str]
+
 class ProductRequest(BaseModel):
     name: str
     category: str
     description: str
     price: Optional[str] = ""
     target_audience: Optional[str] = ""
+    # Restricts which catalog products can be returned as similar
+    filters: Optional[SimilarityFilters] = None
 
 class SimilarProductResponse(BaseModel):
     name: str
@@ -171,6 +283,27 @@ def safe_float_convert(price):
     except (ValueError, TypeError):
         return None
 
+def format_similar_products(similar_products: List[Dict]) -> List[Dict[str, Any]]:
+    """Shape recommender results as SimilarProductResponse entries"""
+    response = []
+    for sp in similar_products:
+        product_data = sp['product']
+        marketing_stats = sp.get('marketing_stats', {})
+        
+        response.append({
+            "name": product_data.get('name', 'Unknown'),
+            "category": product_data.get('category', 'Unknown'),
+            "price": safe_float_convert(product_data.get('price')),
+            "similarity": round(sp['similarity'], 3),
+            "shared_features": sp.get('shared_features', [])[:5],
+            "marketing_performance": {
+                "average_score": marketing_stats.get('avg_performance', 0),
+                "best_platform": marketing_stats.get('best_platform', 'Unknown'),
+                "script_count": marketing_stats.get('script_count', 0)
+            }
+        })
+    return response
+
 def prepare_input_product(product_data: ProductRequest) -> Dict[str, Any]:
     """Prepare input product for the recommender"""
     return {
@@ -182,6 +315,12 @@ def prepare_input_product(product_data: ProductRequest) -> Dict[str, Any]:
         'extracted_features': []  # Will be populated by feature extractor
     }
 
+def similarity_filters(product_data: ProductRequest) -> Optional[Dict[str, Any]]:
+    """Filters for the similarity search, without unset fields"""
+    if product_data.filters is None:
+        return None
+    return product_data.filters.dict(exclude_none=True) or None
+
 # Routes
 @app.get("/", tags=["Root"])
 async def root():
@@ -219,6 +358,42 @@ async def health_check():
             "error": str(e)
         }
 
+async def build_marketing_strategy(product: ProductRequest) -> Dict[str, Any]:
+    """Run similarity search and strategy generation for one product"""
+    # Prepare input product
+    input_product = prepare_input_product(product)
+    
+    # Step 1: Find similar products using advanced ML
+    logger.info("🔍 Finding similar products...")
+    similar_products = await inference_executor.run(
+        recommender.find_similar_products, input_product, 3, similarity_filters(product)
+    )
+    
+    if not similar_products:
+        # Return empty but successful response instead of error
+        similar_products = []
+    
+    logger.info(f"📊 Found {len(similar_products)} similar products")
+    
+    # Step 2: Generate comprehensive marketing package
+    logger.info("🎯 Generating marketing strategy...")
+    marketing_package = await inference_executor.run(
+        script_generator.generate_comprehensive_marketing_package, input_product, similar_products
+    )
+    
+    # Step 3: Prepare response
+    response_data = {
+        "success": True,
+        "input_product": input_product,
+        "similar_products": format_similar_products(similar_products),
+        "marketing_strategy": marketing_package.get('strategy_overview', {}),
+        "performance_insights": marketing_package.get('performance_predictions', {}),
+        "implementation_guide": marketing_package.get('implementation_guidelines', {}),
+        "platform_content": marketing_package.get('platform_specific_content', {})
+    }
+    
+    return response_data
+
 @app.post("/api/generate-marketing-strategy", response_model=AdvancedMarketingResponse, tags=["Advanced Marketing"])
 async def generate_marketing_strategy(product: ProductRequest, background_tasks: BackgroundTasks):
     """Generate comprehensive marketing strategy using advanced ML"""
@@ -234,59 +409,20 @@ async def generate_marketing_strategy(product: ProductRequest, background_tasks:
         if not recommender or not models_loaded:
             raise HTTPException(status_code=503, detail="AI models are not ready. Please check /api/health")
         
-        # Prepare input product
-        input_product = prepare_input_product(product)
-        
-        # Step 1: Find similar products using advanced ML
-        logger.info("🔍 Finding similar products...")
-        similar_products = recommender.find_similar_products(input_product, top_n=3)
-        
-        if not similar_products:
-            # Return empty but successful response instead of error
-            similar_products = []
-        
-        logger.info(f"📊 Found {len(similar_products)} similar products")
-        
-        # Step 2: Generate comprehensive marketing package
-        logger.info("🎯 Generating marketing strategy...")
-        marketing_package = script_generator.generate_comprehensive_marketing_package(
-            input_product, similar_products
+        # Identical requests are served from cache or share one in-flight computation
+        cache_key = request_key(product.dict(), recommender.artifact_version)
+        response_data = await response_cache.get_or_compute(
+            cache_key, lambda: build_marketing_strategy(product)
         )
         
-        # Step 3: Prepare response
-        similar_products_response = []
-        for sp in similar_products:
-            product_data = sp['product']
-            marketing_stats = sp.get('marketing_stats', {})
-            
-            similar_products_response.append({
-                "name": product_data.get('name', 'Unknown'),
-                "category": product_data.get('category', 'Unknown'),
-                "price": safe_float_convert(product_data.get('price')),
-                "similarity": round(sp['similarity'], 3),
-                "shared_features": sp.get('shared_features', [])[:5],
-                "marketing_performance": {
-                    "average_score": marketing_stats.get('avg_performance', 0),
-                    "best_platform": marketing_stats.get('best_platform', 'Unknown'),
-                    "script_count": marketing_stats.get('script_count', 0)
-                }
-            })
-        
-        response_data = {
-            "success": True,
-            "input_product": input_product,
-            "similar_products": similar_products_response,
-            "marketing_strategy": marketing_package.get('strategy_overview', {}),
-            "performance_insights": marketing_package.get('performance_predictions', {}),
-            "implementation_guide": marketing_package.get('implementation_guidelines', {}),
-            "platform_content": marketing_package.get('platform_specific_content', {})
-        }
-        
         logger.info("✅ Successfully generated advanced marketing strategy")
         return response_data
         
     except HTTPException:
         raise
+    except InferenceQueueFull as e:
+        logger.warning(f"⚠️  {e}")
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again in a moment.")
     except Exception as e:
         logger.error(f"❌ Marketing strategy generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Marketing strategy generation failed: {str(e)}")
@@ -304,7 +440,9 @@ async def quick_recommendation(product: ProductRequest):
         input_product = prepare_input_product(product)
         
         # Find similar products
-        similar_products = recommender.find_similar_products(input_product, top_n=3)
+        similar_products = await inference_executor.run(
+            recommender.find_similar_products, input_product, 3, similarity_filters(product)
+        )
         
         if not similar_products:
             # Return default recommendations instead of error
@@ -320,7 +458,9 @@ async def quick_recommendation(product: ProductRequest):
             }
         
         # Get quick recommendations
-        recommendations = recommender.get_recommended_marketing_strategy(input_product, similar_products)
+        recommendations = await inference_executor.run(
+            recommender.get_recommended_marketing_strategy, input_product, similar_products
+        )
         
         return {
             "success": True,
@@ -330,6 +470,11 @@ async def quick_recommendation(product: ProductRequest):
             "content_guidelines": recommendations.get('content_guidelines', {})
         }
         
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"⚠️  {e}")
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again in a moment.")
     except Exception as e:
         logger.error(f"Quick recommendation failed: {e}")
         # Return fallback data instead of error
@@ -351,7 +496,7 @@ async def get_category_insights(category: str):
         if not recommender or not models_loaded:
             raise HTTPException(status_code=503, detail="Models not ready")
         
-        category_patterns = recommender.category_patterns.get(category, {})
+        category_patterns = recommender.current_patterns().get(category, {})
         
         if not category_patterns:
             return {
@@ -379,12 +524,12 @@ async def get_category_insights(category: str):
 async def system_status():
     """Get detailed system status"""
     try:
-        # Get statistics
-        product_count = db.products.count_documents({}) if db else 0
-        script_count = db.scripts.count_documents({}) if db else 0
+        # Get statistics (blocking driver calls run in a worker thread)
+        product_count = await asyncio.to_thread(db.products.count_documents, {}) if db is not None else 0
+        script_count = await asyncio.to_thread(db.scripts.count_documents, {}) if db is not None else 0
         
         # Get category coverage
-        categories = db.products.distinct("category") if db else []
+        categories = await asyncio.to_thread(db.products.distinct, "category") if db is not None else []
         
         status_info = {
             "success": True,
@@ -397,9 +542,15 @@ async def system_status():
             "models": {
                 "status": "loaded" if models_loaded else "unavailable",
                 "loading": models_loading,
-                "categories_trained": len(recommender.category_patterns) if recommender else 0,
-                "products_analyzed": len(recommender.product_ids) if recommender else 0
+                "categories_trained": len(recommender.current_patterns()) if recommender else 0,
+                "products_analyzed": len(recommender.snapshot.product_ids) if recommender and recommender.snapshot else 0,
+                "version": recommender.artifact_version if recommender else None,
+                "query_cache": recommender.query_cache.stats() if recommender else None,
+                "role": Config.MODEL_ROLE,
+                "training": training_status()
             },
+            "response_cache": response_cache.stats(),
+            "inference": inference_executor.stats(),
             "version": "3.0.0"
         }
         
@@ -408,6 +559,43 @@ async def system_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Status check failed: {str(e)}")
 
+@app.post("/api/admin/retrain", status_code=202, tags=["Admin"])
+async def trigger_retrain():
+    """Retrain the models in the background; the current model keeps serving until the swap"""
+    if recommender and recommender.read_only:
+        # Workers never train: hand the request to the trainer process
+        await asyncio.to_thread(model_store.request_retrain)
+        return {"success": True, "training": training_status()}
+    
+    if not recommender or not trainer:
+        raise HTTPException(status_code=503, detail="AI models are not ready. Please check /api/health")
+    
+    if not trainer.start("admin"):
+        raise HTTPException(status_code=409, detail="A retrain is already running")
+    
+    return {"success": True, "training": trainer.status()}
+
+@app.post("/api/admin/products/sync", tags=["Admin"])
+async def sync_products(request: ProductSyncRequest):
+    """Re-index the given products from Mongo right away; deleted ones stop being returned"""
+    if recommender and recommender.read_only:
+        raise HTTPException(status_code=409, detail="Catalog changes are applied by the trainer process")
+    
+    if not recommender or not models_loaded:
+        raise HTTPException(status_code=503, detail="AI models are not ready. Please check /api/health")
+    
+    summary = await asyncio.to_thread(recommender.sync_products, request.product_ids)
+    return {"success": True, "sync": summary}
+
+@app.get("/api/admin/retrain", tags=["Admin"])
+async def retrain_status():
+    """Progress of the current or last retrain"""
+    status = training_status()
+    if status is None:
+        raise HTTPException(status_code=503, detail="AI models are not ready. Please check /api/health")
+    
+    return {"success": True, "training": status}
+
 @app.get("/api/products", tags=["Products"])
 async def get_products(limit: int = 20, skip: int = 0, category: Optional[str] = None):
     """Get products with optional filtering"""
@@ -419,10 +607,10 @@ async def get_products(limit: int = 20, skip: int = 0, category: Optional[str] =
         if category:
             query["category"] = category
         
-        products = list(db.products.find(query).skip(skip).limit(limit))
+        products = await asyncio.to_thread(lambda: list(db.products.find(query).skip(skip).limit(limit)))
         serialized_products = serialize_doc(products)
         
-        total_products = db.products.count_documents(query)
+        total_products = await asyncio.to_thread(db.products.count_documents, query)
         
         return {
             "success": True, 
@@ -438,6 +626,33 @@ async def get_products(limit: int = 20, skip: int = 0, category: Optional[str] =
         logger.error(f"Get products error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@app.get("/api/products/{product_id}/similar", tags=["Products"])
+async def get_similar_products(product_id: str, top_n: int = Query(5, ge=1, le=50)):
+    """Catalog products most similar to a catalog product, from the precomputed neighbour graph"""
+    try:
+        if db is None:
+            raise HTTPException(status_code=500, detail="Database not connected")
+        
+        if not recommender or not models_loaded:
+            raise HTTPException(status_code=503, detail="AI models not available")
+        
+        # A graph lookup plus two product fetches; no model inference, so it skips the inference pool
+        result = await asyncio.to_thread(recommender.find_similar_to_product, product_id, top_n)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Product {product_id} not found in the similarity index")
+        
+        product, similar_products = result
+        return {
+            "success": True,
+            "product": serialize_doc(product),
+            "similar_products": format_similar_products(similar_products)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Similar products lookup error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Similar products lookup failed: {str(e)}")
+
 # Run the application
 if __name__ == "__main__":
     logger.info(f"🚀 Starting BrandWise AI Server on port {Config.PORT}")
@@ -0,0 +1,334 @@
+import os
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+# Rows normalized per step when the vectors are memory-mapped
+NORMALIZE_BLOCK_ROWS = 65536
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def normalize_rows(vectors, block_rows: int = NORMALIZE_BLOCK_ROWS) -> np.ndarray:
+    """Return float32 row-normalized vectors so a dot product is a cosine
+
+    Memory-mapped vectors (e.g. written by out-of-core training) are
+    normalized block by block into a memmap next to their file, so the
+    catalog is never copied into RAM. The file is written under a temporary
+    name and then replaced, so memmaps of a previous index keep their data.
+    """
+    if isinstance(vectors, np.memmap) and vectors.ndim == 2 and vectors.filename and len(vectors):
+        path = f"{vectors.filename}.normalized"
+        out = np.memmap(f"{path}.tmp", dtype=np.float32, mode="w+", shape=vectors.shape)
+        for start in range(0, len(vectors), block_rows):
+            out[start:start + block_rows] = _normalized(np.asarray(vectors[start:start + block_rows], dtype=np.float32))
+        out.flush()
+        del out
+        os.replace(f"{path}.tmp", path)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=vectors.shape)
+    return _normalized(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first, without a full sort"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+# Rows converted from int8 per step when scoring quantized codes, bounding the float32 temporary
+QUANTIZED_BLOCK_ROWS = 16384
+
+
+def quantize_int8(vectors: np.ndarray, block_rows: int = QUANTIZED_BLOCK_ROWS):
+    """Symmetric per-dimension int8 scalar quantization: returns (codes, scale)"""
+    scale = np.abs(vectors).max(axis=0).astype(np.float32) / 127.0
+    scale[scale == 0] = 1.0
+    return encode_int8(vectors, scale, block_rows), scale
+
+
+def encode_int8(vectors: np.ndarray, scale: np.ndarray, block_rows: int = QUANTIZED_BLOCK_ROWS) -> np.ndarray:
+    """Quantize ``vectors`` with an existing ``scale``; out-of-range values are clipped"""
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32) / scale
+        codes[start:start + block_rows] = np.clip(np.rint(block), -127, 127)
+    return codes
+
+
+def int8_scores(codes: np.ndarray, scale: np.ndarray, query: np.ndarray, rows: np.ndarray = None,
+                block_rows: int = QUANTIZED_BLOCK_ROWS) -> np.ndarray:
+    """Approximate dot products of ``query`` with the quantized rows (all rows if ``rows`` is None)"""
+    scaled_query = (query * scale).astype(np.float32)
+    n_rows = len(codes) if rows is None else len(rows)
+    scores = np.empty(n_rows, dtype=np.float32)
+    for start in range(0, n_rows, block_rows):
+        block = codes[start:start + block_rows] if rows is None else codes[rows[start:start + block_rows]]
+        scores[start:start + block_rows] = block.astype(np.float32) @ scaled_query
+    return scores
+
+
+def _tombstone(removed: np.ndarray, rows) -> np.ndarray:
+    """Copy of the ``removed`` mask with ``rows`` set (the mask may be a read-only memmap)"""
+    removed = np.array(removed, dtype=bool)
+    removed[np.asarray(rows, dtype=np.int64)] = True
+    return removed
+
+
+class _ScoredIndex:
+    """Shared scoring for the index types: pre-normalized float32 rows, optionally
+    with an int8 scalar-quantized copy
+
+    With ``quantize`` the first pass scores the int8 codes and only the best
+    ``k * rerank_factor`` candidates are re-scored exactly in float32, so the
+    float32 rows are only touched for the shortlist (and can stay on disk when
+    memory-mapped).
+
+    ``vectors`` holds the rows the index was fit on and is never copied after
+    the fit; rows appended with ``add`` go to the small in-RAM ``added`` tail,
+    which is searched alongside it and takes the positions after it.
+    """
+
+    def _init_scoring(self, quantize: bool, rerank_factor: int):
+        self.quantize = quantize
+        self.rerank_factor = rerank_factor
+        self.vectors = None
+        self.added = None
+        self.removed = None
+        self.codes = None
+        self.added_codes = None
+        self.scale = None
+
+    def _fit_rows(self, vectors):
+        self.vectors = normalize_rows(vectors)
+        self.added = np.empty((0, self.vectors.shape[1]), dtype=np.float32)
+        self.removed = np.zeros(self.vectors.shape[0], dtype=bool)
+
+    def _fit_codes(self):
+        if self.quantize:
+            self.codes, self.scale = quantize_int8(self.vectors)
+            self.added_codes = np.empty((0, self.codes.shape[1]), dtype=np.int8)
+
+    def _add_rows(self, vectors) -> np.ndarray:
+        """Append normalized rows to the tail and return their row positions"""
+        start = len(self)
+        # The tombstone mask grows first so concurrent searches never see it shorter than the rows
+        self.removed = np.concatenate([self.removed, np.zeros(len(vectors), dtype=bool)])
+        if self.codes is not None:
+            self.added_codes = np.vstack([self.added_codes, encode_int8(vectors, self.scale)])
+        self.added = np.vstack([self.added, vectors])
+        return np.arange(start, start + len(vectors))
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0] + self.added.shape[0]
+
+    def take(self, rows) -> np.ndarray:
+        """float32 vectors at the given row positions, fitted or added"""
+        rows = np.asarray(rows, dtype=np.int64)
+        n_fitted = self.vectors.shape[0]
+        if not len(self.added):
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        out = np.empty((len(rows), self.vectors.shape[1]), dtype=np.float32)
+        fitted = rows < n_fitted
+        out[fitted] = self.vectors[rows[fitted]]
+        out[~fitted] = self.added[rows[~fitted] - n_fitted]
+        return out
+
+    def _scores(self, query: np.ndarray, rows: np.ndarray, fitted, added, score) -> np.ndarray:
+        """``score(matrix, rows)`` over ``rows`` (all if None), split between the fitted and added matrices"""
+        n_fitted = len(fitted)
+        if rows is None:
+            if not len(added):
+                return score(fitted, None)
+            return np.concatenate([score(fitted, None), score(added, None)])
+        in_fitted = rows < n_fitted
+        if in_fitted.all():
+            return score(fitted, rows)
+        scores = np.empty(len(rows), dtype=np.float32)
+        scores[in_fitted] = score(fitted, rows[in_fitted])
+        scores[~in_fitted] = score(added, rows[~in_fitted] - n_fitted)
+        return scores
+
+    def _rank(self, query: np.ndarray, k: int, rows: np.ndarray = None):
+        """Best ``k`` live rows among ``rows`` (all rows if None) for a normalized query"""
+        removed = self.removed[:len(self)]
+        excluded = None
+        if rows is not None:
+            rows = rows[~removed[rows]]
+        elif removed.any():
+            excluded = removed
+            k = min(k, int((~removed).sum()))
+
+        if self.codes is None:
+            scores = self._scores(query, rows, self.vectors, self.added,
+                                  lambda matrix, subset: (matrix if subset is None else matrix[subset]) @ query)
+        else:
+            scores = self._scores(query, rows, self.codes, self.added_codes,
+                                  lambda codes, subset: int8_scores(codes, self.scale, query, subset))
+        if excluded is not None:
+            scores[excluded] = -np.inf
+
+        if self.codes is None:
+            best = top_k(scores, k)
+            return (best if rows is None else rows[best]), scores[best]
+
+        shortlist = top_k(scores, k * self.rerank_factor)
+        shortlist = shortlist[np.isfinite(scores[shortlist])]
+        candidates = shortlist if rows is None else rows[shortlist]
+        exact = self.take(candidates) @ query
+        best = top_k(exact, k)
+        return candidates[best], exact[best]
+
+    def memory_per_vector(self) -> dict:
+        """Bytes per product held by the float32 rows and the int8 codes"""
+        dim = self.vectors.shape[1]
+        return {"float32": dim * 4, "int8": dim if self.codes is not None else 0}
+
+
+class ExactIndex(_ScoredIndex):
+    """Brute-force cosine search over every product vector
+
+    Rows added with :meth:`add` get the next positions; :meth:`remove` only
+    tombstones rows, so positions stay aligned with the caller's id list until
+    the index is rebuilt.
+    """
+
+    kind = 'exact'
+
+    def __init__(self, quantize: bool = False, rerank_factor: int = 4):
+        self._init_scoring(quantize, rerank_factor)
+
+    def fit(self, vectors):
+        self._fit_rows(vectors)
+        self._fit_codes()
+        return self
+
+    def add(self, vectors):
+        """Append vectors and return their row positions"""
+        return self._add_rows(normalize_rows(vectors))
+
+    def remove(self, rows):
+        """Exclude rows from future searches"""
+        self.removed = _tombstone(self.removed, rows)
+
+    def search(self, query, k: int, rows: np.ndarray = None):
+        """Return (indices, cosine scores) of the ``k`` nearest products, only among ``rows`` if given"""
+        return self._rank(normalize_rows(query)[0], k, rows)
+
+
+class IVFIndex(_ScoredIndex):
+    """Inverted-file index with a k-means coarse quantizer
+
+    Products are bucketed by their nearest centroid. A query only scores the
+    products in its ``nprobe`` closest buckets, so per-query cost grows with
+    ``N * nprobe / n_lists`` instead of ``N``.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, n_lists: int = None, nprobe: int = 8, random_state: int = 42,
+                 quantize: bool = False, rerank_factor: int = 4):
+        self._init_scoring(quantize, rerank_factor)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.random_state = random_state
+
+        self.centroids = None
+        self.assignments = None
+        self.added_assignments = None
+        self.list_order = None
+        self.list_offsets = None
+
+    def fit(self, vectors):
+        self._fit_rows(vectors)
+        n_samples = self.vectors.shape[0]
+
+        # sqrt(N) lists is the usual balance between probe cost and list size
+        n_lists = self.n_lists or int(np.sqrt(n_samples))
+        n_lists = max(1, min(n_lists, n_samples))
+
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_lists,
+            random_state=self.random_state,
+            batch_size=max(1024, n_lists * 4),
+            n_init=3
+        )
+        self.assignments = kmeans.fit_predict(self.vectors).astype(np.int32)
+        self.centroids = normalize_rows(kmeans.cluster_centers_)
+        self.added_assignments = np.empty(0, dtype=np.int32)
+        self._build_lists()
+        self._fit_codes()
+        return self
+
+    def _build_lists(self):
+        # Store list members contiguously: list i is list_order[offsets[i]:offsets[i+1]]
+        self.list_order = np.argsort(self.assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def add(self, vectors):
+        """Assign vectors to their nearest existing centroid and return their row positions
+
+        Centroids are not refit, so list balance degrades as the catalog drifts
+        away from the data the index was built on. Added rows stay out of the
+        fitted lists; a probe picks them from ``added_assignments``.
+        """
+        vectors = normalize_rows(vectors)
+        # Assign before the rows become visible, so the tail never has rows without a list
+        self.added_assignments = np.concatenate([
+            self.added_assignments, np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        ])
+        return self._add_rows(vectors)
+
+    def remove(self, rows):
+        """Exclude rows from future searches"""
+        self.removed = _tombstone(self.removed, rows)
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        probe = top_k(self.centroids @ query, self.nprobe)
+        candidates = [self.list_order[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe]
+        added = np.flatnonzero(np.isin(self.added_assignments[:len(self.added)], probe))
+        candidates.append(added + self.vectors.shape[0])
+        return np.concatenate(candidates)
+
+    def search(self, query, k: int, rows: np.ndarray = None):
+        """Return (indices, cosine scores) of the approximate ``k`` nearest products
+        
+        With ``rows`` (a pre-filtered subset) only those products are scored:
+        a subset smaller than the probed lists is scanned exactly, otherwise the
+        probed candidates are intersected with it, falling back to the exact
+        scan if fewer than ``k`` of them pass the filter.
+        """
+        query = normalize_rows(query)[0]
+        if rows is None:
+            return self._rank(query, k, self._candidates(query))
+        
+        if len(rows) <= len(self) * self.nprobe / len(self.centroids):
+            return self._rank(query, k, rows)
+        
+        allowed = np.zeros(len(self), dtype=bool)
+        allowed[rows] = True
+        candidates = self._candidates(query)
+        indices, scores = self._rank(query, k, candidates[allowed[candidates]])
+        if len(indices) < k:
+            return self._rank(query, k, rows)
+        return indices, scores
+
+
+INDEX_TYPES = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+}
+
+
+def build_index(vectors, kind: str = 'exact', **params):
+    """Build a similarity index of the given kind over ``vectors``"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Expected one of {tuple(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params).fit(vectors)
@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+
+class BatchingEncoder:
+    """Coalesces concurrent ``encode`` calls into batched sentence-model forward passes
+
+    Each caller's texts are queued; a single worker thread waits up to
+    ``max_wait_ms`` (or until ``max_batch`` texts are pending), encodes them in
+    one call and hands every caller back its own rows. A batch that already
+    holds every active caller is flushed at once, so a lone request never pays
+    the wait. Exposes the same ``encode(texts)`` signature as
+    ``SentenceTransformer`` for drop-in use. :meth:`close` stops the worker
+    once queued requests are served; later calls encode directly.
+    """
+
+    def __init__(self, model, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._active_callers = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+        self._worker.start()
+
+    def encode(self, sentences: List[str], **kwargs) -> np.ndarray:
+        """Encode ``sentences``, sharing a forward pass with concurrent callers"""
+        if isinstance(sentences, str):
+            return self.encode([sentences])[0]
+        if kwargs:
+            # Non-default encode options cannot be shared with other callers
+            return self.model.encode(sentences, **kwargs)
+
+        future = Future()
+        with self._lock:
+            if self._closed:
+                return self.model.encode(sentences)
+            self._active_callers += 1
+        try:
+            self._queue.put((list(sentences), future))
+            return future.result()
+        finally:
+            with self._lock:
+                self._active_callers -= 1
+
+    def close(self, timeout: float = 5.0):
+        """Stop the worker thread after the requests already queued"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Queued after every accepted request, so those are still served
+            self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or time is up
+
+        Returns None once :meth:`close` was called and every earlier request is served.
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch:
+            with self._lock:
+                if len(batch) >= self._active_callers:
+                    break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Serve this batch first; the next collect sees the close
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            texts = [text for sentences, _ in batch for text in sentences]
+            try:
+                vectors = self.model.encode(texts, batch_size=max(len(texts), 1))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for sentences, future in batch:
+                future.set_result(vectors[start:start + len(sentences)])
+                start += len(sentences)
@@ -0,0 +1,486 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import tracemalloc
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.hybrid_vectors import HybridProjector
+from src.ann_index import build_index
+from src import pattern_mining
+from src.batching_encoder import BatchingEncoder
+
+# Synthetic catalog generation keeps the benchmarks independent of MongoDB and
+# of the MiniLM download; embedding cost is identical in every compared mode.
+EMBEDDING_DIM = 384
+
+
+def synthetic_product_texts(n_products: int, vocab_size: int = 5000, words_per_text: int = 40, seed: int = 42):
+    """Generate product-like texts with a Zipfian word distribution"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"word{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    probabilities = (1.0 / ranks) / np.sum(1.0 / ranks)
+    words = rng.choice(vocabulary, size=(n_products, words_per_text), p=probabilities)
+    return [" ".join(row) for row in words]
+
+
+def synthetic_embeddings(n_products: int, dim: int = EMBEDDING_DIM, seed: int = 42) -> np.ndarray:
+    """Generate unit-norm float32 vectors shaped like MiniLM output"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_products, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(func, *args, **kwargs):
+    """Run ``func`` and return (result, seconds, peak traced MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def benchmark_similarity_training(sizes=(5_000, 50_000, 500_000), dense_limit: int = 50_000):
+    """Compare peak memory and train time of the dense and blockwise vector modes"""
+    print("📊 Similarity training: dense vs blockwise")
+    print(f"{'products':>10} {'mode':>10} {'seconds':>10} {'peak MB':>10}")
+
+    for n_products in sizes:
+        texts = synthetic_product_texts(n_products)
+        embeddings = synthetic_embeddings(n_products)
+
+        for mode in HybridProjector.MODES:
+            if mode == 'dense' and n_products > dense_limit:
+                estimated_mb = n_products * (2000 + EMBEDDING_DIM) * 8 / (1024 * 1024)
+                print(f"{n_products:>10} {mode:>10} {'skipped':>10} {f'~{estimated_mb:.0f}':>10}")
+                continue
+
+            def train():
+                vectorizer = TfidfVectorizer(max_features=2000, stop_words='english',
+                                             ngram_range=(1, 3), dtype=np.float32)
+                tfidf_vectors = vectorizer.fit_transform(texts)
+                return HybridProjector(n_components=150, mode=mode).fit_transform(tfidf_vectors, embeddings)
+
+            _, seconds, peak_mb = measure(train)
+            print(f"{n_products:>10} {mode:>10} {seconds:>10.1f} {peak_mb:>10.0f}")
+
+
+def synthetic_product_vectors(n_products: int, dim: int = 150, n_clusters: int = 50, seed: int = 42) -> np.ndarray:
+    """Clustered float32 vectors shaped like the reduced product space"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, n_clusters, size=n_products)
+    return centers[labels] + 0.5 * rng.standard_normal((n_products, dim), dtype=np.float32)
+
+
+def recall_at_k(exact_results, approx_results) -> float:
+    """Mean fraction of the exact top-k found by the approximate search"""
+    hits = [len(set(e) & set(a)) / max(len(e), 1) for e, a in zip(exact_results, approx_results)]
+    return float(np.mean(hits))
+
+
+def benchmark_ann_search(sizes=(5_000, 50_000, 500_000), k: int = 5, n_queries: int = 200,
+                         nprobes=(1, 4, 8, 16, 32)):
+    """Report recall@k and per-query latency of the IVF index against exact search"""
+    print(f"📊 Nearest-neighbour search: recall@{k} vs latency")
+    print(f"{'products':>10} {'index':>10} {'nprobe':>8} {'recall':>8} {'ms/query':>10}")
+
+    for n_products in sizes:
+        vectors = synthetic_product_vectors(n_products)
+        queries = synthetic_product_vectors(n_queries, seed=7)
+
+        exact = build_index(vectors, 'exact')
+        start = time.perf_counter()
+        exact_results = [exact.search(q, k)[0] for q in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+        print(f"{n_products:>10} {'exact':>10} {'-':>8} {1.0:>8.3f} {exact_ms:>10.3f}")
+
+        ivf = build_index(vectors, 'ivf')
+        for nprobe in nprobes:
+            ivf.nprobe = nprobe
+            start = time.perf_counter()
+            ivf_results = [ivf.search(q, k)[0] for q in queries]
+            ivf_ms = (time.perf_counter() - start) * 1000 / n_queries
+            recall = recall_at_k(exact_results, ivf_results)
+            print(f"{n_products:>10} {'ivf':>10} {nprobe:>8} {recall:>8.3f} {ivf_ms:>10.3f}")
+
+
+def benchmark_vector_quantization(sizes=(50_000, 500_000), k: int = 10, n_queries: int = 200,
+                                  rerank_factors=(1, 2, 4, 8)):
+    """Report recall@k, per-query latency and bytes per product of int8 + float32 re-ranking"""
+    print(f"📊 Vector store: float32 vs int8 first pass with float32 re-ranking (recall@{k})")
+    print(f"{'products':>10} {'store':>14} {'recall':>8} {'ms/query':>10} {'resident B/product':>20}")
+
+    for n_products in sizes:
+        vectors = synthetic_product_vectors(n_products)
+        queries = synthetic_product_vectors(n_queries, seed=7)
+
+        exact = build_index(vectors, 'exact')
+        start = time.perf_counter()
+        exact_results = [exact.search(q, k)[0] for q in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+        print(f"{n_products:>10} {'float32':>14} {1.0:>8.3f} {exact_ms:>10.3f} {exact.memory_per_vector()['float32']:>20}")
+
+        quantized = build_index(vectors, 'exact', quantize=True)
+        for rerank_factor in rerank_factors:
+            quantized.rerank_factor = rerank_factor
+            start = time.perf_counter()
+            results = [quantized.search(q, k)[0] for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / n_queries
+            recall = recall_at_k(exact_results, results)
+            # Only the int8 codes must stay resident; float32 rows are read for the shortlist only
+            resident = quantized.memory_per_vector()['int8']
+            print(f"{n_products:>10} {f'int8 x{rerank_factor}':>14} {recall:>8.3f} {ms:>10.3f} {resident:>20}")
+
+
+CATEGORIES = ['Electronics', 'Home & Kitchen', 'Fashion', 'Beauty & Personal Care', 'Sports & Outdoors']
+TONES = ['professional', 'friendly', 'energetic', 'luxury', 'humorous']
+PLATFORMS = ['Instagram', 'YouTube', 'Facebook', 'TikTok', 'Email']
+STRUCTURES = ['feature-benefit', 'problem-solution', 'story-based']
+
+
+def synthetic_catalog(n_products: int, n_scripts: int, seed: int = 42):
+    """Generate product and script documents shaped like the shipped datasets"""
+    rng = np.random.default_rng(seed)
+    products = [
+        {'_id': f"oid{i}", 'product_id': i, 'category': CATEGORIES[i % len(CATEGORIES)]}
+        for i in range(n_products)
+    ]
+    product_refs = rng.integers(0, n_products, size=n_scripts)
+    scores = np.round(rng.uniform(3.0, 10.0, size=n_scripts), 1)
+    scripts = [
+        {
+            'product_id': int(product_refs[i]),
+            'tone': TONES[i % len(TONES)],
+            'platform': PLATFORMS[(i * 7) % len(PLATFORMS)],
+            'content_structure': STRUCTURES[(i * 3) % len(STRUCTURES)],
+            'performance_score': float(scores[i]),
+            'keywords': [f"kw{(i + j) % 200}" for j in range(3)]
+        }
+        for i in range(n_scripts)
+    ]
+    return products, scripts
+
+
+def legacy_category_scripts(products, scripts, categories):
+    """The original per-category linear scan join, kept only for comparison"""
+    for category in categories:
+        for script in scripts:
+            product_id = script.get('product_id')
+            product = next((p for p in products if str(p['product_id']) == str(product_id)), None)
+            if product and product.get('category') == category:
+                pass
+
+
+def benchmark_pattern_training(sizes=(10_000, 100_000, 1_000_000), n_products: int = 5_000,
+                               legacy_sample: int = 200):
+    """Compare the legacy quadratic join with the hash join + groupby pattern trainer
+
+    The legacy join is timed on a sample of scripts and extrapolated linearly,
+    since running it in full takes hours at the larger sizes.
+    """
+    print("📊 Marketing pattern training: legacy join vs vectorized")
+    print(f"{'scripts':>10} {'legacy s':>12} {'vectorized s':>14} {'speedup':>10}")
+
+    for n_scripts in sizes:
+        products, scripts = synthetic_catalog(n_products, n_scripts)
+
+        sample = scripts[:legacy_sample]
+        start = time.perf_counter()
+        legacy_category_scripts(products, sample, CATEGORIES)
+        legacy_seconds = (time.perf_counter() - start) * n_scripts / len(sample)
+
+        start = time.perf_counter()
+        lookup = pattern_mining.build_category_lookup(products)
+        pattern_mining.compute_category_patterns(pattern_mining.scripts_frame(scripts, lookup))
+        vectorized_seconds = time.perf_counter() - start
+
+        print(f"{n_scripts:>10} {f'~{legacy_seconds:.1f}':>12} {vectorized_seconds:>14.2f} "
+              f"{legacy_seconds / vectorized_seconds:>9.0f}x")
+
+
+def run_clients(encode, texts, n_clients: int, requests_per_client: int):
+    """Fire single-text encodes from ``n_clients`` threads, return (req/s, p99 ms)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def client(offset):
+        latencies = []
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            encode([texts[(offset + i) % len(texts)]])
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_clients) as pool:
+        latencies = [lat for result in pool.map(client, range(n_clients)) for lat in result]
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, float(np.percentile(latencies, 99)) * 1000
+
+
+def benchmark_batching_encoder(clients=(1, 8, 32, 128), requests_per_client: int = 20,
+                               max_batch: int = 32, max_wait_ms: float = 5.0):
+    """Throughput and p99 latency of direct vs micro-batched MiniLM encoding
+
+    Unlike the other benchmarks this one needs the real sentence model, since
+    the gain comes from its batched forward pass.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    texts = synthetic_product_texts(512, words_per_text=30)
+    batching = BatchingEncoder(model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    print(f"📊 Query encoding: direct vs micro-batched (max_batch={max_batch}, max_wait={max_wait_ms}ms)")
+    print(f"{'clients':>8} {'mode':>10} {'req/s':>10} {'p99 ms':>10}")
+
+    for n_clients in clients:
+        for mode, encode in (('direct', model.encode), ('batched', batching.encode)):
+            throughput, p99 = run_clients(encode, texts, n_clients, requests_per_client)
+            print(f"{n_clients:>8} {mode:>10} {throughput:>10.1f} {p99:>10.1f}")
+
+
+def catalog_texts(n_products: int):
+    """Product texts from the shipped products.csv, repeated up to ``n_products``"""
+    import pandas as pd
+
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    df = pd.read_csv(os.path.join(data_dir, 'products.csv'))
+    texts = (df['name'].astype(str) + " " + df['category'].astype(str) + " " + df['description'].astype(str)).tolist()
+    return [texts[i % len(texts)] for i in range(n_products)]
+
+
+def benchmark_feature_extraction(sizes=(5_000, 100_000), legacy_sample: int = 1_000,
+                                 batch_size: int = 500, n_process: int = None):
+    """Products/sec of the per-document spaCy loop vs batched multi-process nlp.pipe
+
+    Only the NLP work is timed (no MongoDB writes). The legacy loop runs the
+    full pipeline one document at a time on a sample and is extrapolated.
+    """
+    import spacy
+    from src import feature_extractor
+
+    full_nlp = spacy.load("en_core_web_sm")
+    n_process = n_process or max(1, (os.cpu_count() or 2) - 1)
+
+    print(f"📊 Feature extraction: per-document loop vs nlp.pipe (n_process={n_process})")
+    print(f"{'products':>10} {'loop /s':>10} {'pipe /s':>10} {'speedup':>10}")
+
+    for n_products in sizes:
+        texts = catalog_texts(n_products)
+
+        sample = texts[:legacy_sample]
+        start = time.perf_counter()
+        for text in sample:
+            feature_extractor.features_from_doc(full_nlp(text))
+            feature_extractor.extract_key_phrases(text)
+        loop_rate = len(sample) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for doc, _ in feature_extractor.nlp.pipe(((t, None) for t in texts), as_tuples=True,
+                                                batch_size=batch_size, n_process=n_process):
+            feature_extractor.combine_features(doc)
+        pipe_rate = n_products / (time.perf_counter() - start)
+
+        print(f"{n_products:>10} {loop_rate:>10.0f} {pipe_rate:>10.0f} {pipe_rate / loop_rate:>9.1f}x")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (ru_maxrss is in KB on Linux)"""
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_isolated(func, *args):
+    """Run ``func(*args)`` in a fresh process and return (seconds, peak RSS MB)
+
+    Peak RSS counts memory-mapped pages actually touched, which tracemalloc
+    does not see; a separate process keeps earlier runs out of the peak.
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(_timed_with_rss, (func,) + args)
+
+
+def _timed_with_rss(func, *args):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start, peak_rss_mb() - baseline
+
+
+def _synthetic_chunks(n_products: int, chunk_size: int):
+    """(texts, embeddings) chunks generated on demand, so no pass holds the whole catalog"""
+    for chunk, start in enumerate(range(0, n_products, chunk_size)):
+        size = min(chunk_size, n_products - start)
+        yield synthetic_product_texts(size, seed=chunk), synthetic_embeddings(size, seed=chunk)
+
+
+def _train_in_memory(n_products: int, chunk_size: int, vector_dir: str):
+    chunks = list(_synthetic_chunks(n_products, chunk_size))
+    texts = [text for chunk_texts, _ in chunks for text in chunk_texts]
+    embeddings = np.vstack([chunk_embeddings for _, chunk_embeddings in chunks])
+    vectorizer = TfidfVectorizer(max_features=2000, stop_words='english', ngram_range=(1, 3), dtype=np.float32)
+    tfidf_vectors = vectorizer.fit_transform(texts)
+    vectors = HybridProjector(n_components=150, mode='blockwise').fit_transform(tfidf_vectors, embeddings)
+    build_index(vectors, 'ivf')
+
+
+def _train_out_of_core(n_products: int, chunk_size: int, vector_dir: str):
+    from src.out_of_core import StreamingTfidfVectorizer, IncrementalHybridProjector, VectorFileWriter
+
+    vectorizer = StreamingTfidfVectorizer()
+    embeddings = VectorFileWriter(os.path.join(vector_dir, "sentence_embeddings.f32"), EMBEDDING_DIM)
+    for texts, chunk_embeddings in _synthetic_chunks(n_products, chunk_size):
+        vectorizer.partial_fit(texts)
+        embeddings.write(chunk_embeddings)
+    sentence_vectors = embeddings.close()
+    vectorizer.finalize()
+
+    projector = IncrementalHybridProjector(n_components=150, n_tfidf_features=vectorizer.n_features)
+    start = 0
+    for texts, _ in _synthetic_chunks(n_products, chunk_size):
+        projector.partial_fit(vectorizer.transform(texts), sentence_vectors[start:start + len(texts)])
+        start += len(texts)
+    projector.finish_fit()
+
+    reduced = VectorFileWriter(os.path.join(vector_dir, "product_vectors.f32"), 150)
+    start = 0
+    for texts, _ in _synthetic_chunks(n_products, chunk_size):
+        reduced.write(projector.transform(vectorizer.transform(texts), sentence_vectors[start:start + len(texts)]))
+        start += len(texts)
+    build_index(reduced.close(), 'ivf')
+
+
+def benchmark_out_of_core(sizes=(100_000, 200_000), chunk_size: int = 2_000):
+    """Wall time and peak RSS of in-memory vs out-of-core similarity training
+
+    Both modes run the full fit (vectorizer, projection, IVF index) on the
+    same synthetic catalog, each in a fresh process; only the out-of-core
+    mode streams it in ``chunk_size`` batches through files on disk.
+    """
+    import tempfile
+
+    print("📊 Similarity training: in memory vs out of core")
+    print(f"{'products':>10} {'mode':>12} {'seconds':>10} {'peak MB':>10}")
+
+    for n_products in sizes:
+        for mode, train in (('in_memory', _train_in_memory), ('out_of_core', _train_out_of_core)):
+            with tempfile.TemporaryDirectory() as vector_dir:
+                seconds, peak_mb = run_isolated(train, n_products, chunk_size, vector_dir)
+            print(f"{n_products:>10} {mode:>12} {seconds:>10.1f} {peak_mb:>10.0f}")
+
+
+def write_synthetic_snapshots(snapshot_dir: str, n_products: int, n_scripts: int, seed: int = 42):
+    """Write products and scripts catalog snapshots shaped like the real ones"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src import catalog_snapshot
+
+    rng = np.random.default_rng(seed)
+    categories = np.array([f"category{i}" for i in range(50)])
+    product_ids = [f"p{i}" for i in range(n_products)]
+    products = {
+        "_id": [f"{i:024x}" for i in range(n_products)],
+        "product_id": product_ids,
+        "name": [f"product {i}" for i in range(n_products)],
+        "category": categories[rng.integers(0, len(categories), n_products)].tolist(),
+        "description": synthetic_product_texts(n_products, seed=seed),
+        "extracted_features": [text.split()[:8] for text in synthetic_product_texts(n_products, seed=seed + 1)],
+        "brand": [f"brand{i}" for i in rng.integers(0, 500, n_products)],
+        "price": rng.uniform(5, 500, n_products).tolist(),
+        "target_audience": [f"audience{i}" for i in rng.integers(0, 10, n_products)],
+    }
+    scripts = {
+        "_id": [f"{i:024x}" for i in range(n_scripts)],
+        "product_id": [product_ids[i] for i in rng.integers(0, n_products, n_scripts)],
+        "tone": [f"tone{i}" for i in rng.integers(0, 8, n_scripts)],
+        "platform": [f"platform{i}" for i in rng.integers(0, 6, n_scripts)],
+        "content_structure": [f"structure{i}" for i in rng.integers(0, 5, n_scripts)],
+        "performance_score": rng.uniform(0, 10, n_scripts).tolist(),
+        "keywords": [text.split()[:6] for text in synthetic_product_texts(n_scripts, words_per_text=6, seed=seed + 2)],
+    }
+    os.makedirs(snapshot_dir, exist_ok=True)
+    for name, columns in (("products", products), ("scripts", scripts)):
+        table = pa.table(columns, schema=catalog_snapshot._schema(name))
+        pq.write_table(table, catalog_snapshot.snapshot_path(name, snapshot_dir), compression="zstd")
+
+
+def _training_text(product) -> str:
+    features = " ".join(product.get('extracted_features', []))
+    return f"{product.get('name', '')} {product.get('category', '')} {product.get('description', '')} {features}"
+
+
+def _load_per_stage(snapshot_dir: str):
+    """Previous training load: every stage lists all rows with every snapshot column"""
+    from src.catalog_snapshot import iter_snapshot_rows
+
+    products = list(iter_snapshot_rows("products", snapshot_dir))
+    list(iter_snapshot_rows("scripts", snapshot_dir))
+    texts = [_training_text(product) for product in products]
+    del products
+
+    products = list(iter_snapshot_rows("products", snapshot_dir))
+    scripts = list(iter_snapshot_rows("scripts", snapshot_dir))
+    lookup = pattern_mining.build_category_lookup(products)
+    pattern_mining.compute_category_patterns(pattern_mining.scripts_frame(scripts, lookup))
+    return texts
+
+
+def _load_streamed(snapshot_dir: str):
+    """Current training load: one projected pass per collection, as TrainingDataSource reads snapshots"""
+    from src.catalog_snapshot import iter_snapshot_rows
+    from src.training_data import TRAINING_PRODUCT_FIELDS, PATTERN_SCRIPT_FIELDS
+
+    texts, lookup = [], {}
+    for product in iter_snapshot_rows("products", snapshot_dir, columns=['_id'] + TRAINING_PRODUCT_FIELDS):
+        texts.append(_training_text(product))
+        pattern_mining.add_to_category_lookup(lookup, product)
+    scripts = iter_snapshot_rows("scripts", snapshot_dir, columns=['_id'] + PATTERN_SCRIPT_FIELDS)
+    pattern_mining.compute_category_patterns(pattern_mining.scripts_frame(scripts, lookup))
+    return texts
+
+
+def benchmark_training_load(sizes=((100_000, 500_000), (200_000, 1_000_000))):
+    """Wall time and peak RSS of reading the training data per stage vs streamed once
+
+    Reads synthetic catalog snapshots, so no MongoDB is needed; both modes
+    build the similarity texts and the category patterns, each in a fresh
+    process.
+    """
+    import tempfile
+
+    print("📊 Training data load: per-stage lists vs single streamed pass")
+    print(f"{'products':>10} {'scripts':>10} {'mode':>10} {'seconds':>10} {'peak MB':>10}")
+
+    for n_products, n_scripts in sizes:
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            write_synthetic_snapshots(snapshot_dir, n_products, n_scripts)
+            for mode, load in (('per_stage', _load_per_stage), ('streamed', _load_streamed)):
+                seconds, peak_mb = run_isolated(load, snapshot_dir)
+                print(f"{n_products:>10} {n_scripts:>10} {mode:>10} {seconds:>10.1f} {peak_mb:>10.0f}")
+
+
+BENCHMARKS = {
+    'similarity': benchmark_similarity_training,
+    'ann': benchmark_ann_search,
+    'quantization': benchmark_vector_quantization,
+    'patterns': benchmark_pattern_training,
+    'encoder': benchmark_batching_encoder,
+    'features': benchmark_feature_extraction,
+    'out_of_core': benchmark_out_of_core,
+    'training_load': benchmark_training_load,
+}
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,174 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from config import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Only the fields training reads. Ids are stored as strings because
+# ``product_id`` mixes integer and string ids across the bundled datasets.
+SNAPSHOT_FIELDS = {
+    "products": {
+        "_id": "string",
+        "product_id": "string",
+        "name": "string",
+        "category": "string",
+        "description": "string",
+        "extracted_features": "list",
+        "brand": "string",
+        "price": "float",
+        "target_audience": "string",
+    },
+    "scripts": {
+        "_id": "string",
+        "product_id": "string",
+        "tone": "string",
+        "platform": "string",
+        "content_structure": "string",
+        "performance_score": "float",
+        "keywords": "list",
+    },
+}
+
+
+def snapshots_available() -> bool:
+    return pa is not None
+
+
+def snapshot_path(name: str, snapshot_dir: str = None) -> str:
+    return os.path.join(snapshot_dir or Config.SNAPSHOT_DIR, f"{name}.parquet")
+
+
+def _state_path(name: str, snapshot_dir: str = None) -> str:
+    return os.path.join(snapshot_dir or Config.SNAPSHOT_DIR, f"{name}.state.json")
+
+
+def _schema(name: str):
+    types = {"string": pa.string(), "float": pa.float64(), "list": pa.list_(pa.string())}
+    return pa.schema([(field, types[kind]) for field, kind in SNAPSHOT_FIELDS[name].items()])
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    if kind == "string":
+        return str(value)
+    if kind == "float":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return [str(v) for v in value] if isinstance(value, list) else []
+
+
+def _to_table(name: str, documents) -> "pa.Table":
+    fields = SNAPSHOT_FIELDS[name]
+    columns = {field: [] for field in fields}
+    for document in documents:
+        for field, kind in fields.items():
+            columns[field].append(_coerce(document.get(field), kind))
+    return pa.table(columns, schema=_schema(name))
+
+
+def _read_state(name: str, snapshot_dir: str = None):
+    path = _state_path(name, snapshot_dir)
+    if not os.path.exists(snapshot_path(name, snapshot_dir)) or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(name: str, table, state: dict, snapshot_dir: str = None):
+    path = snapshot_path(name, snapshot_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+    # The watermark is replaced the same way, so a crash never leaves a truncated state file
+    state_path = _state_path(name, snapshot_dir)
+    with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def collection_watermark(collection) -> dict:
+    """Newest ``_id`` and ``updated_at`` of a collection; later writes are newer than one of them"""
+    newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    updated = collection.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    return {
+        "max_id": str(newest["_id"]) if newest else None,
+        "max_updated_at": updated["updated_at"].isoformat() if updated else None,
+    }
+
+
+def refresh_snapshot(db, name: str, snapshot_dir: str = None, full: bool = False) -> int:
+    """Bring the snapshot of ``name`` up to date and return its row count
+
+    Only documents inserted (newer ``_id``) or changed (newer ``updated_at``)
+    since the stored watermark are fetched from Mongo. A full export runs the
+    first time, when ``full`` is set, or when the row count no longer matches
+    the collection (i.e. documents were deleted).
+    """
+    collection = db[name]
+    projection = {field: 1 for field in SNAPSHOT_FIELDS[name]}
+    state = None if full else _read_state(name, snapshot_dir)
+
+    # Read the watermark before exporting so concurrent writes are picked up next time
+    watermark = collection_watermark(collection)
+
+    if state is not None:
+        delta = []
+        if state.get("max_id"):
+            delta.append({"_id": {"$gt": ObjectId(state["max_id"])}})
+        if state.get("max_updated_at"):
+            delta.append({"updated_at": {"$gt": datetime.fromisoformat(state["max_updated_at"])}})
+
+        table = pq.read_table(snapshot_path(name, snapshot_dir), memory_map=True)
+        if table.schema != _schema(name):
+            # Written before the snapshot fields changed; rows cannot be patched
+            table = None
+        elif delta:
+            changed = _to_table(name, collection.find({"$or": delta}, projection))
+            if changed.num_rows:
+                keep = pc.invert(pc.is_in(table["_id"], value_set=changed["_id"]))
+                table = pa.concat_tables([table.filter(keep), changed])
+
+        if table is not None and table.num_rows == collection.estimated_document_count():
+            _write(name, table, watermark, snapshot_dir)
+            print(f"✅ {name} snapshot refreshed incrementally ({table.num_rows} rows)")
+            return table.num_rows
+
+        print(f"⚠️  {name} snapshot is out of sync with the database, re-exporting...")
+
+    table = _to_table(name, collection.find({}, projection).batch_size(Config.TRAINING_BATCH_SIZE))
+    _write(name, table, watermark, snapshot_dir)
+    print(f"✅ {name} snapshot exported ({table.num_rows} rows)")
+    return table.num_rows
+
+
+def load_snapshot(name: str, snapshot_dir: str = None, columns=None):
+    """Read a snapshot (optionally only some ``columns``) through a memory map"""
+    return pq.read_table(snapshot_path(name, snapshot_dir), columns=columns, memory_map=True)
+
+
+def iter_snapshot_rows(name: str, snapshot_dir: str = None, batch_size: int = None, columns=None):
+    """Yield snapshot rows as dicts, one record batch at a time
+
+    Null columns are left out, as missing fields are in the Mongo documents.
+    """
+    table = load_snapshot(name, snapshot_dir, columns)
+    for batch in table.to_batches(max_chunksize=batch_size or Config.TRAINING_BATCH_SIZE):
+        for row in batch.to_pylist():
+            yield {field: value for field, value in row.items() if value is not None}
@@ -5,6 +5,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import pandas as pd
 from pymongo import MongoClient
 from config import MONGO_URI, DB_NAME
+from src.ingestion import ingest_csv, SCHEMA_ADAPTERS
+from src.marketing_stats import rebuild_marketing_stats
 
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
@@ -13,27 +15,14 @@ db = client[DB_NAME]
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
-def load_products():
+def load_products(writers=None):
     try:
         # Correct file path - go up one level from src to backend, then to data folder
         products_path = os.path.join(DATA_DIR, 'products.csv')
         print(f"📁 Looking for products at: {products_path}")
         
-        df = pd.read_csv(products_path, encoding="utf-8")
-        print(f"✅ Loaded {len(df)} products from CSV")
-        
-        # Convert price to float and handle missing values
-        if "price" in df.columns:
-            df["price"] = pd.to_numeric(df["price"], errors='coerce')
-            df["price"] = df["price"].fillna(0.0)
-        
-        # Extract features from description if features column doesn't exist
-        if "features" not in df.columns:
-            print("⚠️  No 'features' column found. Features will be extracted later...")
-        
-        # Insert into MongoDB
-        db.products.insert_many(df.to_dict("records"))
-        print(f"✅ Successfully inserted {len(df)} products into MongoDB")
+        rows = ingest_csv(db, products_path, writers=writers)
+        print(f"✅ Successfully upserted {rows} products into MongoDB")
         
     except FileNotFoundError:
         print(f"❌ Products CSV file not found at: {products_path}")
@@ -43,37 +32,14 @@ def load_products():
         print(f"❌ Error loading products: {e}")
         raise
 
-def load_marketing_copy():
+def load_marketing_copy(writers=None):
     try:
         # Correct file path
         marketing_path = os.path.join(DATA_DIR, 'marketing_copy.csv')
         print(f"📁 Looking for marketing data at: {marketing_path}")
         
-        df = pd.read_csv(marketing_path, encoding="utf-8")
-        print(f"✅ Loaded {len(df)} marketing scripts from CSV")
-        
-        # Convert performance_score and review_score to numeric
-        if "performance_score" in df.columns:
-            df["performance_score"] = pd.to_numeric(df["performance_score"], errors='coerce')
-            df["performance_score"] = df["performance_score"].fillna(5.0)
-        
-        if "review_score" in df.columns:
-            df["review_score"] = pd.to_numeric(df["review_score"], errors='coerce')
-            df["review_score"] = df["review_score"].fillna(1000)
-        
-        # Convert keywords from string to list if they're comma-separated
-        if "keywords" in df.columns:
-            df["keywords"] = df["keywords"].apply(
-                lambda x: x.split(",") if isinstance(x, str) else []
-            )
-        
-        # **NEW: Handle the 'content' column from our generated dataset**
-        if "content" not in df.columns:
-            print("⚠️  No 'content' column found in marketing data")
-        
-        # Insert into MongoDB
-        db.scripts.insert_many(df.to_dict("records"))
-        print(f"✅ Successfully inserted {len(df)} marketing scripts into MongoDB")
+        rows = ingest_csv(db, marketing_path, writers=writers)
+        print(f"✅ Successfully upserted {rows} marketing scripts into MongoDB")
         
     except FileNotFoundError:
         print(f"❌ Marketing CSV file not found at: {marketing_path}")
@@ -83,6 +49,22 @@ def load_marketing_copy():
         print(f"❌ Error loading marketing copy: {e}")
         raise
 
+def load_additional_datasets(writers=None):
+    """Load every other bundled CSV that has a schema adapter (e.g. products2.csv)"""
+    for filename in SCHEMA_ADAPTERS:
+        if filename in ('products.csv', 'marketing_copy.csv'):
+            continue
+        path = os.path.join(DATA_DIR, filename)
+        if not os.path.exists(path):
+            continue
+        
+        print(f"📁 Loading {filename}...")
+        try:
+            rows = ingest_csv(db, path, writers=writers)
+            print(f"✅ Successfully upserted {rows} rows from {filename}")
+        except Exception as e:
+            print(f"❌ Error loading {filename}: {e}")
+
 def check_data_quality():
     """Check if data was loaded correctly"""
     try:
@@ -141,12 +123,14 @@ def create_indexes():
         db.products.create_index("category")
         db.products.create_index("brand")
         db.products.create_index("target_audience")
+        db.products.create_index("updated_at", sparse=True)
         
         db.scripts.create_index("product_id")
         db.scripts.create_index("platform")
         db.scripts.create_index("tone")
         db.scripts.create_index("content_structure")
         db.scripts.create_index("performance_score")
+        db.scripts.create_index("updated_at", sparse=True)
         
         print("✅ Database indexes created successfully")
     except Exception as e:
@@ -210,18 +194,23 @@ if __name__ == "__main__":
         print("❌ Cannot proceed - CSV files not found in correct locations")
         exit(1)
     
-    # Clear existing collections
-    db.products.drop()
-    db.scripts.drop()
-    print("🗑️  Cleared existing collections")
+    # Loading is idempotent; only clear the collections when asked to
+    if "--reset" in sys.argv:
+        db.products.drop()
+        db.scripts.drop()
+        print("🗑️  Cleared existing collections")
     
     # Load new data
     load_products()
     load_marketing_copy()
+    load_additional_datasets()
     
     # Create indexes
     create_indexes()
     
+    # Materialize per-product marketing stats for the recommender
+    print(f"✅ Marketing stats materialized for {rebuild_marketing_stats(db)} products")
+    
     # Check data quality
     check_data_quality()
     
@@ -0,0 +1,356 @@
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Rows buffered by DiskVectorTier.put before they are appended in one write
+WRITE_BUFFER_ROWS = 256
+# Rows copied per step when a tier is compacted
+COMPACT_BLOCK_ROWS = 65536
+
+
+def content_key(text: str) -> str:
+    """Content address of a (preprocessed) text"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class DiskVectorTier:
+    """Append-only float32 vector file addressed by content key, read through a memmap
+
+    Files belong to a generation named in ``<name>.current``:
+    ``<name>.<generation>.vectors`` holds the raw rows and
+    ``<name>.<generation>.keys`` one ``<row> <key>`` line per row. Rows are
+    written before their key, so a crash can at worst lose the last vector,
+    never map a key to a partial row. New rows are buffered in memory and
+    appended in batches (see :meth:`flush`).
+
+    With ``max_rows`` the tier is compacted when a flush would exceed it:
+    the newest half of the rows is copied into a new generation and the old
+    files are deleted.
+
+    A directory has a single writer. Other processes open the tier
+    ``read_only`` and pick up the writer's new rows on a miss. Generation
+    names are never reused, so a reader never maps rows of one generation
+    with keys of another. When the files are removed, readers keep serving
+    from the rows they already mapped.
+    """
+
+    def __init__(self, directory: str, name: str, dim: int, read_only: bool = False, max_rows: int = None):
+        self.directory = directory
+        self.name = name
+        self.dim = dim
+        self.read_only = read_only
+        self.max_rows = max_rows
+        self.row_bytes = dim * 4
+        self.current_path = os.path.join(directory, f"{name}.current")
+
+        self.generation = None
+        self.rows = {}
+        self._n_rows = 0
+        self._keys_offset = 0
+        self._mapped = None
+        self._mapped_rows = 0
+        self._pending = OrderedDict()
+
+        if read_only:
+            self._sync()
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._open_for_writing()
+
+    def _paths(self, generation: str):
+        base = os.path.join(self.directory, f"{self.name}.{generation}")
+        return f"{base}.vectors", f"{base}.keys"
+
+    def _read_generation(self) -> Optional[str]:
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _new_generation(self) -> str:
+        generation = uuid.uuid4().hex
+        vectors_path, keys_path = self._paths(generation)
+        open(vectors_path, "wb").close()
+        open(keys_path, "wb").close()
+        return generation
+
+    def _make_current(self, generation: str):
+        tmp_path = f"{self.current_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(tmp_path, self.current_path)
+
+    def _open_for_writing(self):
+        generation = self._read_generation()
+        if generation is None or not os.path.exists(self._paths(generation)[0]):
+            generation = self._new_generation()
+            self._make_current(generation)
+
+        self.generation = generation
+        vectors_path, keys_path = self._paths(generation)
+        self._n_rows = os.path.getsize(vectors_path) // self.row_bytes
+        self._read_keys()
+
+        # Drop anything past the last complete (vector, key) pair
+        with open(vectors_path, "r+b") as f:
+            f.truncate(self._n_rows * self.row_bytes)
+        with open(keys_path, "r+b") as f:
+            f.truncate(self._keys_offset)
+
+    def _read_keys(self):
+        """Index complete key lines past the last read offset whose vector is on disk"""
+        _, keys_path = self._paths(self.generation)
+        with open(keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        offset = self._keys_offset
+        for line in data.splitlines(keepends=True):
+            parts = line.split()
+            if not line.endswith(b"\n") or len(parts) != 2 or int(parts[0]) >= self._n_rows:
+                break
+            self.rows[parts[1].decode("ascii")] = int(parts[0])
+            offset += len(line)
+        self._keys_offset = offset
+
+    def _sync(self):
+        """Pick up rows appended by the writer (reader side)"""
+        generation = self._read_generation()
+        if generation is None:
+            return
+        if generation != self.generation:
+            self.generation = generation
+            self.rows = {}
+            self._keys_offset = 0
+            self._mapped = None
+            self._mapped_rows = 0
+        try:
+            self._n_rows = os.path.getsize(self._paths(generation)[0]) // self.row_bytes
+            self._read_keys()
+        except FileNotFoundError:
+            # Removed or replaced by the writer; the next sync sees the new generation
+            pass
+
+    def _view(self) -> np.ndarray:
+        if self._mapped_rows < self._n_rows:
+            self._mapped = np.memmap(self._paths(self.generation)[0], dtype=np.float32, mode="r",
+                                     shape=(self._n_rows, self.dim))
+            self._mapped_rows = self._n_rows
+        return self._mapped
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._pending.get(key)
+        if vector is not None:
+            return vector
+        row = self.rows.get(key)
+        if row is None and self.read_only:
+            self._sync()
+            row = self.rows.get(key)
+        if row is None:
+            return None
+        try:
+            return np.array(self._view()[row])
+        except FileNotFoundError:
+            return None
+
+    def remove(self):
+        """Delete the backing files (writer only)"""
+        if self.read_only:
+            return
+        self._mapped = None
+        paths = list(self._paths(self.generation)) + [self.current_path]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.rows = {}
+        self._pending = OrderedDict()
+
+    def __len__(self):
+        return len(self.rows) + len(self._pending)
+
+    def put(self, key: str, vector: np.ndarray):
+        """Buffer a row; the buffer is appended once it holds ``WRITE_BUFFER_ROWS`` rows"""
+        if self.read_only or key in self.rows or key in self._pending:
+            return
+        self._pending[key] = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        if len(self._pending) >= WRITE_BUFFER_ROWS:
+            self.flush()
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        """Append many rows with one write per file"""
+        if self.read_only:
+            return
+        for key, vector in zip(keys, vectors):
+            if key not in self.rows:
+                self._pending[key] = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        self.flush()
+
+    def flush(self):
+        """Append the buffered rows: all vectors first, then their keys"""
+        if self.read_only or not self._pending:
+            return
+        pending = list(self._pending.items())
+        self._pending = OrderedDict()
+        if self.max_rows and self._n_rows + len(pending) > self.max_rows:
+            pending = pending[-self.max_rows:]
+            self._compact(max(0, min(self.max_rows // 2, self.max_rows - len(pending))))
+
+        vectors_path, keys_path = self._paths(self.generation)
+        start = self._n_rows
+        with open(vectors_path, "ab") as f:
+            f.write(np.stack([vector for _, vector in pending]).tobytes())
+        lines = "".join(f"{start + i} {key}\n" for i, (key, _) in enumerate(pending)).encode("ascii")
+        with open(keys_path, "ab") as f:
+            f.write(lines)
+        self._n_rows += len(pending)
+        self._keys_offset += len(lines)
+        self.rows.update((key, start + i) for i, (key, _) in enumerate(pending))
+
+    def _compact(self, keep: int):
+        """Move the newest ``keep`` rows into a new generation and delete the old files"""
+        survivors = sorted(self.rows.items(), key=lambda item: item[1])[-keep:] if keep else []
+        old_paths = self._paths(self.generation)
+        generation = self._new_generation()
+        vectors_path, keys_path = self._paths(generation)
+
+        if survivors:
+            source = self._view()
+            rows = np.fromiter((row for _, row in survivors), dtype=np.int64, count=len(survivors))
+            with open(vectors_path, "ab") as f:
+                for start in range(0, len(rows), COMPACT_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(source[rows[start:start + COMPACT_BLOCK_ROWS]]).tobytes())
+        lines = "".join(f"{i} {key}\n" for i, (key, _) in enumerate(survivors)).encode("ascii")
+        with open(keys_path, "ab") as f:
+            f.write(lines)
+
+        # Readers switch on their next miss; rows they already mapped stay readable
+        self._make_current(generation)
+        self._mapped = None
+        self._mapped_rows = 0
+        for path in old_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.generation = generation
+        self.rows = {key: i for i, (key, _) in enumerate(survivors)}
+        self._n_rows = len(survivors)
+        self._keys_offset = len(lines)
+        print(f"🧹 Embedding cache {self.name} compacted to {len(survivors)} rows")
+
+
+class EmbeddingCache:
+    """Content-addressed vector cache with an in-process LRU and optional disk tier
+
+    Entries live in a ``namespace`` (e.g. the encoder name or the model
+    artifact version); switching namespace with :meth:`reset` invalidates
+    everything computed under the previous one. With ``read_only`` the disk
+    tier is only read (another process writes it) and new entries stay in memory.
+    ``max_disk_rows`` bounds the disk tier of a namespace.
+    """
+
+    def __init__(self, namespace: str = None, dim: int = None, max_items: int = 10000, disk_dir: str = None,
+                 read_only: bool = False, max_disk_rows: int = None):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.read_only = read_only
+        self.max_disk_rows = max_disk_rows
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reset(namespace, dim)
+
+    def reset(self, namespace: str, dim: int = None, discard_previous: bool = False):
+        """Drop cached entries and start caching under ``namespace``
+
+        The disk tier is only used when both a namespace and the vector
+        dimension are known. ``discard_previous`` also deletes the old
+        namespace's disk files.
+        """
+        with self._lock:
+            previous = getattr(self, "_disk", None)
+            if discard_previous and previous is not None and namespace != self.namespace:
+                previous.remove()
+            elif previous is not None:
+                previous.flush()
+
+            self.namespace = namespace
+            self._memory = OrderedDict()
+            self._disk = None
+            if self.disk_dir and namespace and dim:
+                name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)
+                self._disk = DiskVectorTier(self.disk_dir, name, dim, read_only=self.read_only,
+                                            max_rows=self.max_disk_rows)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = content_key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._disk is not None:
+                vector = self._disk.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: np.ndarray):
+        key = content_key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._disk is not None:
+                self._disk.put(key, vector)
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Cache many vectors, appending them to the disk tier in one write"""
+        keys = [content_key(text) for text in texts]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            if self._disk is not None:
+                self._disk.put_many(keys, vectors)
+
+    def flush(self):
+        """Write rows still buffered for the disk tier"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Cached vectors for ``texts`` keyed by position; misses are omitted"""
+        found = {}
+        for i, text in enumerate(texts):
+            vector = self.get(text)
+            if vector is not None:
+                found[i] = vector
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "namespace": self.namespace,
+                "items": len(self._memory),
+                "disk_items": len(self._disk) if self._disk is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -2,17 +2,22 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pymongo import MongoClient
-from config import MONGO_URI, DB_NAME
+from pymongo import MongoClient, UpdateOne, ReplaceOne
+from pymongo.errors import OperationFailure
+from config import MONGO_URI, DB_NAME, Config
 import spacy
 import re
+import time
+import hashlib
+from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 from typing import List, Dict
 
-# Load SpaCy English model
+# Load SpaCy English model. Feature extraction only needs POS tags and lemmas,
+# so the dependency parser and NER are never loaded.
 try:
-    nlp = spacy.load("en_core_web_sm")
+    nlp = spacy.load("en_core_web_sm", exclude=["parser", "ner"])
     print("✅ SpaCy model loaded successfully")
 except OSError:
     print("❌ SpaCy model not found. Please install with: python -m spacy download en_core_web_sm")
@@ -26,8 +31,10 @@ def extract_features_from_text(text):
     if not text or not nlp:
         return []
     
-    doc = nlp(text)
-    
+    return features_from_doc(nlp(text))
+
+def features_from_doc(doc):
+    """Key features (noun/adjective lemmas) from an already processed spaCy doc"""
     # Extract nouns and adjectives as key features
     features = []
     for token in doc:
@@ -55,46 +62,97 @@ def extract_key_phrases(text):
     
     return specifications + materials + benefits
 
-def update_products_features():
-    """Extract and update features for all products"""
+def product_text(product):
+    """Text the features of a product are extracted from"""
+    return f"{product.get('name', '')} {product.get('category', '')} {product.get('description', '')}"
+
+def content_hash(text):
+    """Hash stored next to extracted features to detect stale products"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def combine_features(doc):
+    """NLP features plus key phrases, limited to the 15 most relevant
+    
+    ``doc`` is a spaCy doc, or the plain text when spaCy is unavailable.
+    """
+    if isinstance(doc, str):
+        return extract_key_phrases(doc)[:15]
+    
+    all_features = features_from_doc(doc) + extract_key_phrases(doc.text)
+    return all_features[:15]
+
+def update_products_features(batch_size=None, n_process=None, force=False):
+    """Extract and update features for new or changed products
+    
+    Each product stores a hash of its name, category and description; only
+    products whose hash is missing or stale are processed unless ``force``.
+    Products are streamed in batches through ``nlp.pipe`` (optionally across
+    several processes) and written back with unordered bulk updates.
+    
+    Returns the categories touched by the update.
+    """
     print("🔄 Extracting features from product descriptions...")
     
+    batch_size = batch_size or Config.FEATURE_BATCH_SIZE
+    n_process = n_process or Config.FEATURE_PROCESSES
+    
+    cursor = db.products.find(
+        {}, {"name": 1, "category": 1, "description": 1, "features_hash": 1, "features_category": 1}
+    ).batch_size(batch_size)
+    
+    touched_categories = set()
+    skipped = 0
+    
+    def stale_texts():
+        nonlocal skipped
+        for product in cursor:
+            text = product_text(product)
+            text_hash = content_hash(text)
+            if not force and product.get("features_hash") == text_hash:
+                skipped += 1
+                continue
+            # A product that moved category also changes its old category's stats
+            touched_categories.add(product.get("category"))
+            if product.get("features_category") is not None:
+                touched_categories.add(product["features_category"])
+            yield text, (product["_id"], text_hash, product.get("category"))
+    
+    texts = stale_texts()
+    
+    # Without spaCy only the key phrases are extracted from the raw text
+    docs = nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process) if nlp else texts
+    
     products_updated = 0
-    for product in db.products.find():
-        description = product.get("description", "")
-        name = product.get("name", "")
-        category = product.get("category", "")
-        
-        # Combine text for feature extraction
-        combined_text = f"{name} {category} {description}"
-        
-        # Extract features using NLP
-        nlp_features = extract_features_from_text(combined_text)
-        
-        # Extract key phrases and specifications
-        key_phrases = extract_key_phrases(combined_text)
-        
-        # Combine all features
-        all_features = nlp_features + key_phrases
-        
-        # Limit to top 15 most relevant features
-        relevant_features = all_features[:15]
-        
-        # Update product in database
-        db.products.update_one(
-            {"_id": product["_id"]}, 
+    operations = []
+    start = time.perf_counter()
+    
+    for doc, (product_id, text_hash, category) in docs:
+        relevant_features = combine_features(doc)
+        operations.append(UpdateOne(
+            {"_id": product_id},
             {"$set": {
                 "extracted_features": relevant_features,
-                "feature_count": len(relevant_features)
+                "feature_count": len(relevant_features),
+                "features_hash": text_hash,
+                "features_category": category,
+                "updated_at": datetime.utcnow()
             }}
-        )
-        
-        products_updated += 1
+        ))
         
-        if products_updated % 500 == 0:
-            print(f"   Processed {products_updated} products...")
+        if len(operations) >= batch_size:
+            db.products.bulk_write(operations, ordered=False)
+            products_updated += len(operations)
+            operations = []
+            rate = products_updated / (time.perf_counter() - start)
+            print(f"   Processed {products_updated} products ({rate:.0f} products/sec)...")
     
-    print(f"✅ Features extracted for {products_updated} products")
+    if operations:
+        db.products.bulk_write(operations, ordered=False)
+        products_updated += len(operations)
+    
+    print(f"✅ Features extracted for {products_updated} products ({skipped} unchanged, skipped)")
+    touched_categories.discard(None)
+    return touched_categories
 
 def analyze_marketing_patterns():
     """Analyze patterns in marketing data for feature extraction"""
@@ -119,46 +177,150 @@ def analyze_marketing_patterns():
     print(f"✅ Found {len(top_keywords)} top-performing keywords")
     return top_keywords
 
-def create_feature_mappings():
-    """Create category-specific feature mappings"""
+TOP_CATEGORY_FEATURES = 20
+
+def _category_feature_pipeline(categories=None, refreshed_at=None):
+    """Server-side top-N extracted features per category, merged into category_features"""
+    pipeline = []
+    if categories is not None:
+        pipeline.append({"$match": {"category": {"$in": categories}}})
+    
+    pipeline += [
+        {"$project": {"_id": 0, "category": 1, "extracted_features": 1}},
+        {"$unwind": "$extracted_features"},
+        {"$group": {
+            "_id": {"category": "$category", "feature": "$extracted_features"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id.category": 1, "count": -1, "_id.feature": 1}},
+        {"$group": {"_id": "$_id.category", "features": {"$push": "$_id.feature"}}},
+        {"$project": {
+            "_id": 0,
+            "category": "$_id",
+            "common_features": {"$slice": ["$features", TOP_CATEGORY_FEATURES]},
+            "refreshed_at": {"$literal": refreshed_at}
+        }},
+        {"$merge": {
+            "into": "category_features",
+            "on": "category",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+    return pipeline
+
+def _category_feature_counts_numpy(categories=None):
+    """Top-N features per category counted client-side with NumPy
+    
+    Used when the store cannot run the aggregation (e.g. an embedded or
+    in-memory Mongo). Only the category and feature fields are streamed.
+    """
+    query = {"category": {"$in": categories}} if categories is not None else {}
+    cursor = db.products.find(query, {"_id": 0, "category": 1, "extracted_features": 1})
+    
+    category_codes, feature_codes = {}, {}
+    pair_categories, pair_features = [], []
+    for product in cursor:
+        features = product.get("extracted_features") or []
+        if not features:
+            continue
+        category_code = category_codes.setdefault(product.get("category"), len(category_codes))
+        for feature in features:
+            pair_categories.append(category_code)
+            pair_features.append(feature_codes.setdefault(feature, len(feature_codes)))
+    
+    if not pair_categories:
+        return {}
+    
+    n_features = len(feature_codes)
+    pairs = np.asarray(pair_categories, dtype=np.int64) * n_features + np.asarray(pair_features, dtype=np.int64)
+    unique_pairs, counts = np.unique(pairs, return_counts=True)
+    pair_category, pair_feature = np.divmod(unique_pairs, n_features)
+    
+    feature_names = np.array(list(feature_codes), dtype=object)
+    top_features = {}
+    for category, code in category_codes.items():
+        mask = pair_category == code
+        order = np.argsort(-counts[mask], kind="stable")[:TOP_CATEGORY_FEATURES]
+        top_features[category] = feature_names[pair_feature[mask][order]].tolist()
+    return top_features
+
+def create_feature_mappings(categories=None):
+    """Create category-specific feature mappings
+    
+    Counts run as one aggregation that writes with ``$merge``, so only the
+    per-category top features are produced and products never leave the
+    server. ``categories`` limits the rebuild to those categories.
+    """
     print("🗺️ Creating feature mappings...")
     
-    categories = db.products.distinct("category")
-    category_features = {}
+    scope = {}
+    if categories is not None:
+        categories = list(categories)
+        scope = {"category": {"$in": categories}}
     
-    for category in categories:
-        # Get all products in this category
-        category_products = db.products.find({"category": category})
-        
-        all_features = []
-        for product in category_products:
-            features = product.get("extracted_features", [])
-            all_features.extend(features)
-        
-        # Get most common features for this category
-        from collections import Counter
-        feature_counts = Counter(all_features)
-        top_features = [feature for feature, count in feature_counts.most_common(20)]
-        
-        category_features[category] = top_features
-        print(f"   {category}: {len(top_features)} common features")
+    db.category_features.create_index("category", unique=True)
+    refreshed_at = datetime.utcnow()
+    
+    try:
+        db.products.aggregate(_category_feature_pipeline(categories, refreshed_at), allowDiskUse=True)
+    except OperationFailure as e:
+        print(f"⚠️  Aggregation unavailable ({e}), counting features locally...")
+        operations = [
+            ReplaceOne(
+                {"category": category},
+                {"category": category, "common_features": features, "refreshed_at": refreshed_at},
+                upsert=True
+            )
+            for category, features in _category_feature_counts_numpy(categories).items()
+        ]
+        if operations:
+            db.category_features.bulk_write(operations, ordered=False)
     
-    # Store category features in database
-    db.category_features.delete_many({})
-    for category, features in category_features.items():
-        db.category_features.insert_one({
-            "category": category,
-            "common_features": features
-        })
+    # Categories in scope that no longer have any features
+    db.category_features.delete_many({**scope, "refreshed_at": {"$not": {"$gte": refreshed_at}}})
     
-    print(f"✅ Feature mappings created for {len(categories)} categories")
+    mapped = db.category_features.count_documents(scope)
+    print(f"✅ Feature mappings created for {mapped} categories")
 
-def extract_marketing_insights():
-    """Extract insights from marketing performance data"""
-    print("💡 Extracting marketing insights...")
+INSIGHT_DIMENSIONS = ["tone", "platform", "content_structure"]
+MIN_INSIGHT_SCRIPTS = 10  # Only consider groups with sufficient data
+
+def _index_scan(plan, field):
+    """Whether an explain plan reads ``field`` through an index"""
+    if isinstance(plan, dict):
+        if plan.get("stage") in ("IXSCAN", "EXPRESS_IXSCAN") and next(iter(plan.get("keyPattern", {})), None) == field:
+            return True
+        return any(_index_scan(value, field) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_index_scan(value, field) for value in plan)
+    return False
+
+def ensure_insight_indexes():
+    """Make sure the script -> product lookup and the delta scan are index-backed
     
-    # Analyze which tones work best for which categories
-    pipeline = [
+    Asks the query planner instead of reading the index list, so an index it
+    would not use for these queries (e.g. a compound one led by another
+    field) does not count.
+    """
+    checks = [
+        (db.products, "product_id", {"product_id": ""}, {}),
+        (db.scripts, "updated_at", {"updated_at": {"$gt": datetime.min}}, {"sparse": True}),
+    ]
+    for collection, field, query, options in checks:
+        plan = collection.find(query).explain().get("queryPlanner", {}).get("winningPlan", {})
+        if not _index_scan(plan, field):
+            print(f"⚠️  {collection.name}.{field} lookups are not index-backed, creating index...")
+            collection.create_index(field, **options)
+
+def _insights_pipeline(script_match=None, categories=None, refreshed_at=None):
+    """Aggregate (category, dimension) performance groups and merge them into marketing_insights"""
+    pipeline = []
+    if script_match:
+        pipeline.append({"$match": script_match})
+    
+    pipeline += [
+        {"$project": {"product_id": 1, "performance_score": 1, **{d: 1 for d in INSIGHT_DIMENSIONS}}},
         {
             "$lookup": {
                 "from": "products",
@@ -167,45 +329,167 @@ def extract_marketing_insights():
                 "as": "product_info"
             }
         },
-        {"$unwind": "$product_info"},
+        {"$unwind": "$product_info"}
+    ]
+    if categories is not None:
+        pipeline.append({"$match": {"product_info.category": {"$in": categories}}})
+    
+    # One facet per dimension so every group is computed from all of its scripts
+    facets = {}
+    for dimension in INSIGHT_DIMENSIONS:
+        facet = [
+            {
+                "$group": {
+                    "_id": {
+                        "category": "$product_info.category",
+                        dimension: f"${dimension}"
+                    },
+                    "avg_performance": {"$avg": "$performance_score"},
+                    "count": {"$sum": 1}
+                }
+            },
+            {"$addFields": {"dimension": dimension}}
+        ]
+        facets[dimension] = facet
+    
+    pipeline += [
+        {"$facet": facets},
+        {"$project": {"rows": {"$concatArrays": [f"${d}" for d in INSIGHT_DIMENSIONS]}}},
+        {"$unwind": "$rows"},
+        {"$replaceRoot": {"newRoot": "$rows"}},
+        {"$addFields": {"refreshed_at": refreshed_at}},
+        {"$merge": {"into": "marketing_insights", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    return pipeline
+
+def _script_watermark():
+    """Newest script ``_id`` and ``updated_at`` right now, and the script count"""
+    newest = db.scripts.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    updated = db.scripts.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)])
+    return {
+        "watermark_id": newest["_id"] if newest else None,
+        "watermark_updated_at": updated["updated_at"] if updated else None,
+        "script_count": db.scripts.count_documents({})
+    }
+
+def _affected_categories(state):
+    """Categories of the scripts added or changed since ``state``"""
+    delta = []
+    if state.get("watermark_id") is not None:
+        delta.append({"_id": {"$gt": state["watermark_id"]}})
+    if state.get("watermark_updated_at") is not None:
+        delta.append({"updated_at": {"$gt": state["watermark_updated_at"]}})
+    if not delta:
+        return None
+    
+    pipeline = [
+        {"$match": {"$or": delta}},
         {
-            "$group": {
-                "_id": {
-                    "category": "$product_info.category",
-                    "tone": "$tone"
-                },
-                "avg_performance": {"$avg": "$performance_score"},
-                "count": {"$sum": 1}
+            "$lookup": {
+                "from": "products",
+                "localField": "product_id",
+                "foreignField": "product_id",
+                "as": "product_info"
             }
         },
-        {"$match": {"count": {"$gte": 10}}},  # Only consider tones with sufficient data
-        {"$sort": {"avg_performance": -1}}
+        {"$unwind": "$product_info"},
+        {"$group": {"_id": "$product_info.category"}}
     ]
+    return [group["_id"] for group in db.scripts.aggregate(pipeline)]
+
+def _scripts_deleted(state, watermark):
+    """Whether scripts were deleted since ``state`` (deletions leave no watermark trace)"""
+    if state.get("script_count") is None:
+        return True
+    inserted = 0
+    if state.get("watermark_id") is not None:
+        inserted = db.scripts.count_documents({"_id": {"$gt": state["watermark_id"]}})
+    elif watermark["watermark_id"] is not None:
+        inserted = db.scripts.count_documents({})
+    return state["script_count"] + inserted != watermark["script_count"]
+
+def extract_marketing_insights(categories=None, full=False):
+    """Extract insights from marketing performance data
     
-    tone_effectiveness = list(db.scripts.aggregate(pipeline))
+    Maintains marketing_insights as a ``$merge``-based materialized view of
+    average performance per (category, tone), (category, platform) and
+    (category, content_structure). Rows are replaced in place, so readers
+    never see an empty collection.
     
-    # Store insights in database
-    db.marketing_insights.delete_many({})
-    for insight in tone_effectiveness:
-        db.marketing_insights.insert_one(insight)
+    Incremental runs recompute every group of the categories touched by
+    scripts added or changed since the last run, plus ``categories``
+    (products that changed category), and then delete the groups of those
+    categories that were not refreshed: a script that changed tone leaves
+    its old group with fewer scripts or none. ``full`` recomputes everything,
+    as does a run after scripts were deleted.
+    """
+    print("💡 Extracting marketing insights...")
+    
+    ensure_insight_indexes()
+    
+    state = db.job_state.find_one({"_id": "marketing_insights"})
+    watermark = _script_watermark()
+    refreshed_at = datetime.utcnow()
+    
+    affected = None
+    if not full and state is not None and not _scripts_deleted(state, watermark):
+        # None when there is no watermark to compare against
+        affected = _affected_categories(state)
     
-    print(f"✅ Extracted {len(tone_effectiveness)} marketing insights")
+    if affected is None:
+        db.scripts.aggregate(_insights_pipeline(refreshed_at=refreshed_at), allowDiskUse=True)
+        # Groups that no longer exist at all
+        db.marketing_insights.delete_many({"refreshed_at": {"$not": {"$gte": refreshed_at}}})
+    else:
+        scope = sorted(set(affected) | set(categories or []))
+        if scope:
+            # Only the scripts of products in scope go through the lookup
+            product_ids = db.products.distinct("product_id", {"category": {"$in": scope}})
+            db.scripts.aggregate(
+                _insights_pipeline(
+                    script_match={"product_id": {"$in": product_ids}},
+                    categories=scope,
+                    refreshed_at=refreshed_at
+                ),
+                allowDiskUse=True
+            )
+            # Groups of these categories that lost all their scripts
+            db.marketing_insights.delete_many({
+                "_id.category": {"$in": scope},
+                "refreshed_at": {"$not": {"$gte": refreshed_at}}
+            })
+    
+    # Keep only groups with sufficient data
+    db.marketing_insights.delete_many({"count": {"$lt": MIN_INSIGHT_SCRIPTS}})
+    
+    db.job_state.replace_one({"_id": "marketing_insights"}, {**watermark, "refreshed_at": refreshed_at}, upsert=True)
+    
+    refreshed = db.marketing_insights.count_documents({"refreshed_at": refreshed_at})
+    print(f"✅ Refreshed {refreshed} marketing insights")
 
-def main():
-    """Main function to run all feature extraction processes"""
+def main(full=False):
+    """Main function to run all feature extraction processes
+    
+    By default only new or changed products are processed and only their
+    categories are re-aggregated; ``full`` reprocesses everything.
+    """
     print("🚀 Starting Feature Extraction Pipeline...")
     
     # Step 1: Extract features from product descriptions
-    update_products_features()
+    touched_categories = update_products_features(force=full)
+    categories = None if full else touched_categories
     
     # Step 2: Analyze marketing patterns
     successful_keywords = analyze_marketing_patterns()
     
     # Step 3: Create category feature mappings
-    create_feature_mappings()
+    if full or touched_categories:
+        create_feature_mappings(categories)
+    else:
+        print("✅ No product changes, category feature mappings are up to date")
     
-    # Step 4: Extract marketing insights
-    extract_marketing_insights()
+    # Step 4: Extract marketing insights (also picks up new or rescored scripts)
+    extract_marketing_insights(touched_categories, full=full)
     
     # Final summary
     product_count = db.products.count_documents({})
@@ -217,4 +501,4 @@ def main():
     print(f"   Marketing insights extracted: {db.marketing_insights.count_documents({})}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(full="--full" in sys.argv)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+
+
+class HybridProjector:
+    """Projects TF-IDF and sentence-embedding blocks into one product vector space.
+
+    ``blockwise`` (default) reduces the sparse TF-IDF block and the dense
+    embedding block with separate truncated SVDs and concatenates the results,
+    so the TF-IDF matrix is never densified. ``dense`` keeps the original
+    behaviour (densify, concatenate, single SVD) for comparison.
+    """
+
+    MODES = ('blockwise', 'dense')
+
+    def __init__(self, n_components: int = 150, mode: str = 'blockwise', random_state: int = 42):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown vector mode '{mode}'. Expected one of {self.MODES}")
+
+        self.n_components = n_components
+        self.mode = mode
+        self.random_state = random_state
+
+        self.svd = None
+        self.tfidf_svd = None
+        self.embedding_svd = None
+
+    @staticmethod
+    def _cap_components(requested: int, n_samples: int, n_features: int) -> int:
+        """TruncatedSVD needs fewer components than both samples and features"""
+        return max(1, min(requested, n_samples - 1, n_features - 1))
+
+    def fit_transform(self, tfidf_vectors, sentence_vectors) -> np.ndarray:
+        """Fit the reduction on the catalog and return the product vectors"""
+        n_samples = tfidf_vectors.shape[0]
+        sentence_vectors = np.asarray(sentence_vectors, dtype=np.float32)
+
+        if self.mode == 'dense':
+            combined = np.concatenate([tfidf_vectors.toarray(), sentence_vectors], axis=1)
+            self.svd = TruncatedSVD(
+                n_components=self._cap_components(self.n_components, n_samples, combined.shape[1]),
+                random_state=self.random_state
+            )
+            return self.svd.fit_transform(combined).astype(np.float32)
+
+        # Split the component budget between both blocks
+        tfidf_components = self.n_components // 2
+        embedding_components = self.n_components - tfidf_components
+
+        self.tfidf_svd = TruncatedSVD(
+            n_components=self._cap_components(tfidf_components, n_samples, tfidf_vectors.shape[1]),
+            random_state=self.random_state
+        )
+        self.embedding_svd = TruncatedSVD(
+            n_components=self._cap_components(embedding_components, n_samples, sentence_vectors.shape[1]),
+            random_state=self.random_state
+        )
+
+        tfidf_reduced = self.tfidf_svd.fit_transform(sparse.csr_matrix(tfidf_vectors))
+        embedding_reduced = self.embedding_svd.fit_transform(sentence_vectors)
+
+        return np.hstack([tfidf_reduced, embedding_reduced]).astype(np.float32, copy=False)
+
+    def transform(self, tfidf_vectors, sentence_vectors) -> np.ndarray:
+        """Project new items (e.g. an incoming product request) into the fitted space"""
+        sentence_vectors = np.asarray(sentence_vectors, dtype=np.float32)
+
+        if self.mode == 'dense':
+            combined = np.concatenate([tfidf_vectors.toarray(), sentence_vectors], axis=1)
+            return self.svd.transform(combined).astype(np.float32)
+
+        tfidf_reduced = self.tfidf_svd.transform(sparse.csr_matrix(tfidf_vectors))
+        embedding_reduced = self.embedding_svd.transform(sentence_vectors)
+
+        return np.hstack([tfidf_reduced, embedding_reduced]).astype(np.float32, copy=False)
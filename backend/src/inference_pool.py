@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class InferenceQueueFull(Exception):
+    """Raised when more requests are waiting than the configured queue depth"""
+
+
+class InferenceExecutor:
+    """Bounded thread pool for CPU-bound inference and blocking database calls
+
+    Keeps MiniLM encoding, SVD projection and pymongo round-trips off the event
+    loop. Torch and pymongo release the GIL, so threads give real parallelism
+    while sharing one loaded model. Requests beyond ``max_workers + queue_depth``
+    are rejected instead of queuing without bound.
+    """
+
+    def __init__(self, max_workers: int = 4, queue_depth: int = 32, stats_window: int = 1000):
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._wait_times = deque(maxlen=stats_window)
+        self._rejected = 0
+
+    def _timed(self, submitted_at: float, func, args, kwargs):
+        with self._lock:
+            self._wait_times.append(time.perf_counter() - submitted_at)
+        return func(*args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func`` on the pool and await its result"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.queue_depth:
+                self._rejected += 1
+                raise InferenceQueueFull(f"Inference queue is full ({self.queue_depth} waiting)")
+            self._in_flight += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self._timed, time.perf_counter(), func, args, kwargs
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self) -> dict:
+        """Queue depth and recent queue wait times in milliseconds"""
+        with self._lock:
+            waits = np.array(self._wait_times) * 1000
+            in_flight = self._in_flight
+            rejected = self._rejected
+
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": in_flight,
+            "queued": max(0, in_flight - self.max_workers),
+            "rejected": rejected,
+            "queue_wait_ms": {
+                "avg": round(float(waits.mean()), 2) if waits.size else 0.0,
+                "p95": round(float(np.percentile(waits, 95)), 2) if waits.size else 0.0,
+                "max": round(float(waits.max()), 2) if waits.size else 0.0
+            }
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,307 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import hashlib
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+from pymongo import UpdateOne
+from config import Config
+from src import marketing_stats
+
+try:
+    from pyarrow import csv as arrow_csv
+    import pyarrow as pa
+except ImportError:
+    print("⚠️  pyarrow not installed. Falling back to the pandas CSV reader...")
+    arrow_csv = None
+
+# Declarative adapters that normalize every bundled CSV layout into the
+# product and script document models. Supported keys:
+#   collection / key  target collection and the field documents are upserted on
+#   integer / numeric columns coerced to int / float, with the value used for blanks
+#                     (None keeps blanks missing)
+#   rename            source column -> model field
+#   melt              wide layout: one document per listed column, tagged in ``var_name``
+#   derive            computed fields: a stable hash of other columns, or a column's first word
+#   resolve           fields looked up in another collection by a source column; rows that
+#                     match nothing keep their derived value
+#   split             comma-separated string columns turned into lists
+#   defaults          fields the layout lacks entirely
+#   stats_key         field whose materialized marketing stats are refreshed for changed rows
+SCHEMA_ADAPTERS = {
+    "products.csv": {
+        "collection": "products",
+        "key": "product_id",
+        "integer": {"product_id": None},
+        "numeric": {"price": None},
+    },
+    "products2.csv": {
+        "collection": "products",
+        "key": "product_id",
+        "rename": {"reviews": "review_count"},
+        "integer": {"review_count": 0},
+        "numeric": {"price": None},
+        "derive": {
+            # No product_id in this layout, so derive a stable one from the row content
+            "product_id": {"hash": ["name", "category", "description", "price"], "prefix": "p2-"},
+            # Product names start with the brand ("Nike Shoes Max 95")
+            "brand": {"first_word": "name"},
+        },
+        "defaults": {"target_audience": "General"},
+    },
+    "marketing_copy.csv": {
+        "collection": "scripts",
+        "key": "script_id",
+        "integer": {"script_id": None, "product_id": None},
+        "numeric": {"performance_score": 5.0, "review_score": 1000},
+        "split": {"keywords": ","},
+        "stats_key": "product_id",
+    },
+    "marketing_copy2.csv": {
+        "collection": "scripts",
+        "key": "script_id",
+        "melt": {
+            "id_columns": ["product_name"],
+            "columns": {"video_script": "YouTube", "email_copy": "Email", "social_post": "Instagram"},
+            "var_name": "platform",
+            "value_name": "content",
+        },
+        "derive": {
+            "script_id": {"hash": ["product_name", "platform"], "prefix": "mc2-"},
+            "product_id": {"hash": ["product_name"], "prefix": "mc2-product-"},
+        },
+        "resolve": {
+            # Scripts only name their product; link them to an ingested product with that name
+            # when there is one, otherwise they stay under the derived product_id
+            "product_id": {"collection": "products", "match": "name", "source": "product_name"},
+        },
+        "defaults": {"tone": "professional", "content_structure": "feature-benefit"},
+        "stats_key": "product_id",
+    },
+}
+
+
+def read_csv_chunks(path: str, block_size: int = None):
+    """Yield DataFrame chunks parsed by Arrow's multi-threaded CSV reader
+
+    Every column is read as a string and typed by the adapter, so a chunk whose
+    values look different from the first one can never fail type inference.
+    """
+    if arrow_csv is None:
+        yield from pd.read_csv(path, encoding="utf-8", dtype=str, keep_default_na=False,
+                               chunksize=Config.DATA_LOAD_CHUNK_SIZE)
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+
+    reader = arrow_csv.open_csv(
+        path,
+        read_options=arrow_csv.ReadOptions(use_threads=True, block_size=block_size or Config.DATA_LOAD_BLOCK_SIZE),
+        convert_options=arrow_csv.ConvertOptions(
+            column_types={column: pa.string() for column in header},
+            strings_can_be_null=False
+        )
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def _stable_ids(df: pd.DataFrame, columns, prefix: str) -> pd.Series:
+    hashes = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+    return prefix + hashes.map("{:016x}".format)
+
+
+def adapt_chunk(df: pd.DataFrame, adapter: dict) -> pd.DataFrame:
+    """Normalize one raw chunk into model documents using column-wise operations"""
+    if "melt" in adapter:
+        melt = adapter["melt"]
+        df = df.melt(
+            id_vars=melt["id_columns"],
+            value_vars=list(melt["columns"]),
+            var_name=melt["var_name"],
+            value_name=melt["value_name"]
+        )
+        df[melt["var_name"]] = df[melt["var_name"]].map(melt["columns"])
+
+    df = df.rename(columns=adapter.get("rename", {}))
+
+    # Blank strings are missing values for every typed column
+    for column, fill in adapter.get("numeric", {}).items():
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            df[column] = values.fillna(fill) if fill is not None else values
+    for column, fill in adapter.get("integer", {}).items():
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            if fill is not None:
+                values = values.fillna(fill)
+            df[column] = values.astype("Int64")
+
+    for column, rule in adapter.get("derive", {}).items():
+        if "hash" in rule:
+            df[column] = _stable_ids(df, rule["hash"], rule.get("prefix", ""))
+        elif "first_word" in rule:
+            df[column] = df[rule["first_word"]].str.split(n=1).str[0]
+
+    for column, separator in adapter.get("split", {}).items():
+        if column in df.columns:
+            df[column] = df[column].str.split(separator).where(df[column] != "", None)
+
+    for column, value in adapter.get("defaults", {}).items():
+        if column not in df.columns:
+            df[column] = value
+
+    # Missing values become None so Mongo stores nulls rather than NaN
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+
+def resolve_fields(db, df: pd.DataFrame, adapter: dict) -> pd.DataFrame:
+    """Fill ``resolve`` fields with one lookup per field; unmatched rows keep their derived value"""
+    for column, rule in adapter.get("resolve", {}).items():
+        names = df[rule["source"]].dropna().unique().tolist()
+        documents = db[rule["collection"]].find(
+            {rule["match"]: {"$in": names}}, {rule["match"]: 1, column: 1}
+        )
+        lookup = {doc[rule["match"]]: doc.get(column) for doc in documents}
+        # Built as an object column so integer ids are not widened to float around the gaps
+        resolved = pd.Series([lookup.get(name) for name in df[rule["source"]]], index=df.index, dtype=object)
+
+        unmatched = resolved.isna()
+        if column in df:
+            resolved = resolved.where(~unmatched, df[column])
+        df = df.assign(**{column: resolved})
+        if unmatched.any():
+            print(f"ℹ️  {int(unmatched.sum())} rows whose '{rule['source']}' matches no "
+                  f"{rule['collection']} '{rule['match']}' keep their derived {column}")
+    return df
+
+
+def _records(df: pd.DataFrame, adapter: dict):
+    records = df.to_dict("records")
+    for record in records:
+        # Scripts without keywords get an empty list, as the model expects
+        for column in adapter.get("split", {}):
+            if record.get(column) is None:
+                record[column] = []
+    return records
+
+
+def _row_hash(record) -> str:
+    return hashlib.sha1(repr(sorted(record.items())).encode("utf-8")).hexdigest()
+
+
+def _upsert_operation(key, record, row_hash, loaded_at):
+    """Upsert keyed on ``key``; ``updated_at`` only moves when the row content changed"""
+    return UpdateOne(
+        {key: record[key]},
+        [
+            {"$set": {"updated_at": {"$cond": [
+                {"$eq": ["$source_hash", row_hash]}, "$updated_at", loaded_at
+            ]}}},
+            # $literal keeps values such as "$120 off" from being read as field paths
+            {"$set": {**{field: {"$literal": value} for field, value in record.items()},
+                      "source_hash": row_hash}}
+        ],
+        upsert=True
+    )
+
+
+def _write_chunk(collection, key, records, loaded_at, stats_key=None):
+    """Upsert one chunk; returns (rows, inserted, ``stats_key`` values of new or changed rows)
+
+    For a changed row both its previous and its new ``stats_key`` value are
+    reported, so a script moved to another product refreshes both.
+    """
+    hashes = [_row_hash(record) for record in records]
+    touched = set()
+    if stats_key:
+        previous = {
+            doc[key]: doc for doc in collection.find(
+                {key: {"$in": [record[key] for record in records]}}, {key: 1, stats_key: 1, "source_hash": 1}
+            )
+        }
+        for record, row_hash in zip(records, hashes):
+            old = previous.get(record[key])
+            if old is None or old.get("source_hash") != row_hash:
+                touched.add(record.get(stats_key))
+                if old is not None:
+                    touched.add(old.get(stats_key))
+        touched.discard(None)
+
+    operations = [_upsert_operation(key, record, row_hash, loaded_at) for record, row_hash in zip(records, hashes)]
+    result = collection.bulk_write(operations, ordered=False)
+    return len(records), result.upserted_count, touched
+
+
+def ingest_csv(db, path: str, adapter: dict = None, writers: int = None) -> int:
+    """Stream a CSV into Mongo through its schema adapter, upserting on the adapter key
+
+    Chunks are parsed by Arrow and written by a pool of parallel writers, with
+    at most two chunks per writer in memory. Re-running with the same file
+    updates documents in place instead of duplicating them.
+    """
+    adapter = adapter or SCHEMA_ADAPTERS[os.path.basename(path)]
+    writers = writers or Config.DATA_LOAD_WRITERS
+    collection = db[adapter["collection"]]
+    key = adapter["key"]
+
+    collection.create_index(key)
+    # Change detection (fingerprint, snapshots, insights) reads the newest updated_at
+    collection.create_index("updated_at", sparse=True)
+    loaded_at = datetime.utcnow()
+
+    stats_key = adapter.get("stats_key")
+    rows_done = 0
+    rows_inserted = 0
+    touched = set()
+    start = time.perf_counter()
+    pending = set()
+
+    def collect(done):
+        nonlocal rows_done, rows_inserted
+        for future in done:
+            written, inserted, changed = future.result()
+            rows_done += written
+            rows_inserted += inserted
+            touched.update(changed)
+        rate = rows_done / max(time.perf_counter() - start, 1e-9)
+        print(f"   {rows_done} rows written ({rate:.0f} rows/sec)...")
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for chunk in read_csv_chunks(path):
+            df = resolve_fields(db, adapt_chunk(chunk, adapter), adapter)
+            if key not in df.columns:
+                raise ValueError(f"CSV {path} has no '{key}' column to upsert on")
+
+            keyless = df[key].isna()
+            if keyless.any():
+                print(f"⚠️  Skipping {int(keyless.sum())} rows without '{key}'")
+                df = df[~keyless]
+
+            pending.add(pool.submit(_write_chunk, collection, key, _records(df, adapter), loaded_at, stats_key))
+
+            # Bound memory: wait for a writer before parsing further ahead
+            if len(pending) >= writers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        if pending:
+            done, _ = wait(pending)
+            collect(done)
+
+    elapsed = time.perf_counter() - start
+    print(f"   {rows_done} rows in {elapsed:.1f}s ({rows_done / max(elapsed, 1e-9):.0f} rows/sec), "
+          f"{rows_inserted} new, {rows_done - rows_inserted} updated")
+
+    # Keep a built stats table current; a first load is materialized in full by the caller
+    if touched and marketing_stats.is_materialized(db):
+        marketing_stats.refresh_marketing_stats(db, sorted(touched, key=str))
+        print(f"   Marketing stats refreshed for {len(touched)} products")
+    return rows_done
@@ -0,0 +1,149 @@
+import numpy as np
+
+# Query rows and candidate columns scored per step; a block's float32 scores and
+# partition indices take 12 bytes per cell, about 100 MB at these sizes
+KNN_BLOCK_ROWS = 1024
+KNN_BLOCK_COLS = 8192
+# An IVF list is compared with at most this many times ``nprobe`` lists, so the
+# build stays near N * nprobe / n_lists comparisons per product instead of N
+KNN_PROBE_FACTOR = 2
+
+
+def _merge_top_k(ids: np.ndarray, scores: np.ndarray, k: int):
+    """Keep the ``k`` best columns of every row of (ids, scores), best first"""
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ids = np.take_along_axis(ids, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _block_neighbors(index, rows: np.ndarray, candidates: np.ndarray, k: int, block_cols: int):
+    """Top ``k`` of sorted ``candidates`` for each of ``rows``, excluding the row itself"""
+    queries = index.take(rows)
+    best_ids = np.empty((len(rows), 0), dtype=np.int64)
+    best_scores = np.empty((len(rows), 0), dtype=np.float32)
+
+    for start in range(0, len(candidates), block_cols):
+        columns = candidates[start:start + block_cols]
+        scores = queries @ index.take(columns).T
+
+        # A product is not its own neighbour
+        position = np.minimum(np.searchsorted(columns, rows), len(columns) - 1)
+        is_self = columns[position] == rows
+        scores[np.flatnonzero(is_self), position[is_self]] = -np.inf
+
+        width = min(k, len(columns))
+        local = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+        best_ids = np.hstack([best_ids, columns[local]])
+        best_scores = np.hstack([best_scores, np.take_along_axis(scores, local, axis=1)])
+        best_ids, best_scores = _merge_top_k(best_ids, best_scores, k)
+
+    return best_ids, best_scores
+
+
+def _candidate_groups(index, live: np.ndarray, probe_factor: int = KNN_PROBE_FACTOR):
+    """(rows, candidate rows) pairs covering every live row of the index
+
+    An exact index compares every product with every other one. An IVF index
+    compares the members of each list with the ``probe_factor * nprobe`` lists
+    its members probe most often when searched (the closest lists to its
+    centroid break ties). The union of every member's probes would cover most
+    of the catalog for large lists and make the build quadratic.
+    """
+    if getattr(index, 'kind', 'exact') != 'ivf':
+        rows = np.flatnonzero(live)
+        yield rows, rows
+        return
+
+    n_fitted = index.vectors.shape[0]
+    added_assignments = index.added_assignments[:len(index) - n_fitted]
+
+    def members(list_id):
+        members = np.concatenate([
+            index.list_order[index.list_offsets[list_id]:index.list_offsets[list_id + 1]],
+            np.flatnonzero(added_assignments == list_id) + n_fitted
+        ])
+        return members[live[members]]
+
+    n_lists = len(index.centroids)
+    nprobe = min(index.nprobe, n_lists)
+    width = min(n_lists, probe_factor * nprobe)
+    for list_id in range(n_lists):
+        rows = np.sort(members(list_id))
+        if len(rows) == 0:
+            continue
+        probed = np.argpartition(-(index.take(rows) @ index.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        # Probe counts, plus a tie-break below 1 from the similarity of the centroids
+        votes = np.bincount(probed.ravel(), minlength=n_lists) + (index.centroids @ index.centroids[list_id] + 1) / 4
+        votes[list_id] = np.inf
+        lists = np.argpartition(-votes, width - 1)[:width]
+        yield rows, np.sort(np.concatenate([members(i) for i in lists]))
+
+
+class KnnGraph:
+    """Precomputed nearest neighbours of every indexed product
+
+    Row ``r`` of ``neighbors`` (int32, -1 when there are fewer than ``k``) and
+    ``scores`` (float16 cosine) lists the closest products to index row ``r``,
+    best first, so "products similar to catalog item X" is a lookup instead of
+    a model inference. ``id_order`` sorts the graph's product ids for a binary
+    search from id to row. Products added incrementally after the graph was
+    built are neither in it nor among its neighbours until the next full fit.
+    """
+
+    def __init__(self, neighbors: np.ndarray, scores: np.ndarray, id_order: np.ndarray):
+        self.neighbors = neighbors
+        self.scores = scores
+        self.id_order = id_order
+
+    @classmethod
+    def build(cls, index, product_ids, k: int, block_rows: int = KNN_BLOCK_ROWS,
+              block_cols: int = KNN_BLOCK_COLS) -> "KnnGraph":
+        """Compute the graph for ``index`` with blocked matrix products of bounded size"""
+        n_rows = len(index)
+        live = ~np.asarray(index.removed[:n_rows], dtype=bool)
+        neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+        scores = np.zeros((n_rows, k), dtype=np.float16)
+
+        for rows, candidates in _candidate_groups(index, live):
+            for start in range(0, len(rows), block_rows):
+                block = rows[start:start + block_rows]
+                ids, block_scores = _block_neighbors(index, block, candidates, k, block_cols)
+                found = np.isfinite(block_scores)
+                width = ids.shape[1]
+                neighbors[block, :width] = np.where(found, ids, -1)
+                scores[block, :width] = np.where(found, block_scores, 0)
+
+        id_order = np.argsort(np.asarray(product_ids[:n_rows], dtype=str), kind='stable').astype(np.int64)
+        return cls(neighbors, scores, id_order)
+
+    def __len__(self):
+        return len(self.neighbors)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def row_of(self, product_ids, product_id: str) -> int:
+        """Graph row of ``product_id`` (binary search over ``id_order``), or -1"""
+        lo, hi = 0, len(self.id_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if str(product_ids[self.id_order[mid]]) < product_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.id_order) and str(product_ids[self.id_order[lo]]) == product_id:
+            return int(self.id_order[lo])
+        return -1
+
+    def lookup(self, row: int, top_n: int, removed: np.ndarray = None):
+        """(rows, scores) of the stored neighbours of ``row``, skipping removed products"""
+        rows = self.neighbors[row].astype(np.int64)
+        scores = self.scores[row].astype(np.float32)
+        keep = rows >= 0
+        if removed is not None:
+            keep[keep] = ~removed[rows[keep]]
+        return rows[keep][:top_n], scores[keep][:top_n]
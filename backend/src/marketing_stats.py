@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from typing import Dict, List
+
+# Materialized per-product stats, one document per script ``product_id``
+STATS_COLLECTION = "product_marketing_stats"
+
+# Products recomputed per aggregation by refresh_marketing_stats
+REFRESH_BATCH_SIZE = 10000
+
+DEFAULT_STATS = {
+    "avg_performance": 6.0,
+    "best_platform": "Instagram",
+    "script_count": 0,
+    "top_performing_script": None
+}
+
+
+def default_stats() -> Dict:
+    return dict(DEFAULT_STATS)
+
+
+def stats_pipeline(product_ids: List = None) -> List[Dict]:
+    """Aggregation computing marketing stats per script ``product_id``
+
+    Without ``product_ids`` every script is grouped in a single pass.
+    """
+    pipeline = []
+    if product_ids is not None:
+        pipeline.append({"$match": {"product_id": {"$in": product_ids}}})
+
+    pipeline += [
+        {"$sort": {"performance_score": -1}},
+        # Per (product, platform): score totals and the best script
+        {"$group": {
+            "_id": {"product_id": "$product_id", "platform": {"$ifNull": ["$platform", "Instagram"]}},
+            "score_sum": {"$sum": {"$ifNull": ["$performance_score", 6.0]}},
+            "count": {"$sum": 1},
+            "top_script": {"$first": "$$ROOT"}
+        }},
+        {"$addFields": {"platform_avg": {"$divide": ["$score_sum", "$count"]}}},
+        {"$sort": {"platform_avg": -1}},
+        # Per product: overall average, best platform and per-platform top scripts
+        {"$group": {
+            "_id": "$_id.product_id",
+            "score_sum": {"$sum": "$score_sum"},
+            "script_count": {"$sum": "$count"},
+            "best_platform": {"$first": "$_id.platform"},
+            "top_scripts": {"$push": "$top_script"}
+        }},
+        {"$project": {
+            "avg_performance": {"$divide": ["$score_sum", "$script_count"]},
+            "best_platform": 1,
+            "script_count": 1,
+            "top_performing_script": {"$reduce": {
+                "input": "$top_scripts",
+                "initialValue": None,
+                "in": {"$cond": [
+                    {"$or": [
+                        {"$eq": ["$$value", None]},
+                        {"$gt": ["$$this.performance_score", "$$value.performance_score"]}
+                    ]},
+                    "$$this",
+                    "$$value"
+                ]}
+            }}
+        }}
+    ]
+    return pipeline
+
+
+def _materialize(db, product_ids: List = None) -> datetime:
+    refreshed_at = datetime.utcnow()
+    pipeline = stats_pipeline(product_ids) + [
+        {"$addFields": {"refreshed_at": refreshed_at}},
+        {"$merge": {"into": STATS_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    db.scripts.aggregate(pipeline, allowDiskUse=True)
+    return refreshed_at
+
+
+def rebuild_marketing_stats(db) -> int:
+    """Recompute the whole stats table in one pass over ``scripts``
+
+    Rows are replaced in place, so readers never see an empty table; rows for
+    products that lost all their scripts are removed afterwards.
+    """
+    refreshed_at = _materialize(db)
+    db[STATS_COLLECTION].delete_many({"refreshed_at": {"$lt": refreshed_at}})
+    return db[STATS_COLLECTION].estimated_document_count()
+
+
+def refresh_marketing_stats(db, product_ids: List):
+    """Recompute stats only for products whose scripts were inserted, changed or rescored
+
+    Called by ingestion with the affected ``product_id`` values, in batches so
+    each ``$in`` stays small.
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), REFRESH_BATCH_SIZE):
+        batch = product_ids[start:start + REFRESH_BATCH_SIZE]
+        refreshed_at = _materialize(db, batch)
+        db[STATS_COLLECTION].delete_many({
+            "_id": {"$in": batch},
+            "refreshed_at": {"$lt": refreshed_at}
+        })
+
+
+def is_materialized(db) -> bool:
+    return db[STATS_COLLECTION].estimated_document_count() > 0
+
+
+def load_marketing_stats(db, product_ids: List) -> Dict:
+    """Read precomputed stats by script ``product_id`` (missing means no scripts)"""
+    if not product_ids:
+        return {}
+    cursor = db[STATS_COLLECTION].find({"_id": {"$in": product_ids}}, {"refreshed_at": 0})
+    return {row.pop("_id"): row for row in cursor}
+
+
+def compute_marketing_stats(db, product_ids: List) -> Dict:
+    """Compute stats live from ``scripts`` when the table has not been built yet"""
+    if not product_ids:
+        return {}
+    return {row.pop("_id"): row for row in db.scripts.aggregate(stats_pipeline(product_ids))}
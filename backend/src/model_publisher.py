@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from config import Config
+from src import model_store
+from src.recommender import AdvancedMarketingRecommender
+
+
+def run(poll_seconds: float = None):
+    """Single trainer process for multi-worker deployments
+
+    Trains and publishes the model bundle that server processes started with
+    MODEL_ROLE=worker map read-only, then retrains whenever a worker forwards
+    a request from the admin retrain endpoint. Products written to Mongo in
+    between are indexed incrementally and saved in batches.
+    """
+    poll_seconds = poll_seconds or Config.MODEL_POLL_SECONDS
+    recommender = AdvancedMarketingRecommender(read_only=False)
+
+    model_store.consume_retrain_request()
+    if not recommender.load_saved_models():
+        print("🔄 Catalog changed or no saved models, training...")
+        recommender.retrain()
+
+    print(f"👀 Watching for retrain requests every {poll_seconds:.0f}s...")
+    last_sync = time.monotonic()
+    while True:
+        time.sleep(poll_seconds)
+        if model_store.consume_retrain_request():
+            print("🔄 Retrain requested by a worker...")
+            recommender.retrain()
+            last_sync = time.monotonic()
+        elif Config.CATALOG_POLL_SECONDS > 0 and time.monotonic() - last_sync >= Config.CATALOG_POLL_SECONDS:
+            try:
+                recommender.sync_catalog_changes()
+                recommender.flush_incremental_changes(force=False)
+            except Exception as e:
+                print(f"⚠️  Could not sync catalog changes: {e}")
+            last_sync = time.monotonic()
+
+
+if __name__ == "__main__":
+    run()
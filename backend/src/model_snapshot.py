@@ -0,0 +1,36 @@
+from typing import Any, Dict, List, NamedTuple
+
+
+class ModelSnapshot(NamedTuple):
+    """Immutable view of everything similarity search and pattern lookups read
+
+    The recommender publishes a new snapshot by swapping a single reference,
+    so a request that grabbed one keeps a consistent model while the next is
+    trained or published. Nothing reachable from a snapshot is modified in
+    place; changes derive a new snapshot with ``_replace``.
+
+    ``projection_version`` only changes when the vectorizer/projection is
+    refit, so query vectors cached under it survive incremental updates.
+    ``ungraphed_rows`` maps the ids of live products the neighbour graph does
+    not cover (added or changed since it was built) to their index rows.
+    """
+
+    version: str
+    projection_version: str
+    tfidf_vectorizer: Any
+    svd: Any
+    product_vectors: Any
+    product_ids: List[str]
+    index: Any
+    metadata: Any
+    knn_graph: Any
+    ungraphed_rows: Dict[str, int]
+    category_patterns: Dict[str, Dict]
+    fitted_products: int
+    pending_changes: int
+    catalog_watermark: Dict[str, Any]
+
+    @property
+    def drift(self) -> float:
+        """Share of the fitted catalog added, changed or removed since the last full fit"""
+        return self.pending_changes / max(self.fitted_products, 1)
@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import json
+from datetime import datetime
+
+import joblib
+from config import Config
+
+# Bump whenever the layout of the bundle or the meaning of a field changes so
+# that older artifacts are rebuilt instead of being loaded into new code.
+ARTIFACT_FORMAT_VERSION = 8
+
+ARTIFACT_FILENAME = "recommender_bundle.joblib"
+RETRAIN_REQUEST_FILENAME = "retrain.request"
+
+
+def artifact_path(model_dir: str = None) -> str:
+    """Location of the recommender bundle on disk"""
+    return os.path.join(model_dir or Config.MODEL_DIR, ARTIFACT_FILENAME)
+
+
+def catalog_fingerprint(db) -> str:
+    """Cheap hash of the catalog state used to decide whether a retrain is needed
+
+    Uses document counts plus the newest ``_id`` and ``updated_at`` of both
+    collections, answered from collection metadata, the ``_id`` index and the
+    sparse ``updated_at`` indexes that ingestion and data_loader create.
+    """
+    state = {}
+    for name in ("products", "scripts"):
+        collection = db[name]
+        newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        updated = collection.find_one(
+            {"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)]
+        )
+        state[name] = {
+            "count": collection.estimated_document_count(),
+            "max_id": str(newest["_id"]) if newest else None,
+            "max_updated_at": str(updated["updated_at"]) if updated else None,
+        }
+
+    payload = json.dumps(state, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def save_bundle(bundle: dict, fingerprint: str, model_dir: str = None) -> dict:
+    """Write the bundle atomically so a crash never leaves a half-written file
+
+    Returns the bundle as stored, including its version metadata.
+    """
+    path = artifact_path(model_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    payload = dict(bundle)
+    payload["format_version"] = ARTIFACT_FORMAT_VERSION
+    payload["fingerprint"] = fingerprint
+    payload["created_at"] = datetime.utcnow().isoformat()
+
+    tmp_path = f"{path}.tmp"
+    joblib.dump(payload, tmp_path)
+    os.replace(tmp_path, path)
+    return payload
+
+
+def load_bundle(fingerprint: str = None, model_dir: str = None):
+    """Load the bundle, or return None if it is missing, outdated or stale
+
+    Passing ``fingerprint=None`` skips the staleness check.
+    """
+    path = artifact_path(model_dir)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        # Large arrays (product vectors, ids, index lists) are mapped read-only rather than
+        # read into memory, so every process loading the same bundle shares their pages
+        bundle = joblib.load(path, mmap_mode="r")
+    except Exception as e:
+        print(f"⚠️  Could not read model artifacts at {path}: {e}")
+        return None
+
+    if bundle.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        print("⚠️  Model artifacts were written by an older version, rebuilding...")
+        return None
+
+    if fingerprint is not None and bundle.get("fingerprint") != fingerprint:
+        print("⚠️  Catalog changed since the artifacts were built, rebuilding...")
+        return None
+
+    return bundle
+
+
+def bundle_stamp(model_dir: str = None):
+    """Identity of the bundle file currently published, or None if there is none
+
+    Bundles are replaced atomically, so a new inode or mtime means a new bundle.
+    """
+    try:
+        stat = os.stat(artifact_path(model_dir))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def request_retrain(model_dir: str = None):
+    """Ask the trainer process for a retrain (used by worker processes)"""
+    path = os.path.join(model_dir or Config.MODEL_DIR, RETRAIN_REQUEST_FILENAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(datetime.utcnow().isoformat())
+
+
+def retrain_requested(model_dir: str = None) -> bool:
+    return os.path.exists(os.path.join(model_dir or Config.MODEL_DIR, RETRAIN_REQUEST_FILENAME))
+
+
+def consume_retrain_request(model_dir: str = None) -> bool:
+    """Clear a pending retrain request; returns True if there was one"""
+    try:
+        os.remove(os.path.join(model_dir or Config.MODEL_DIR, RETRAIN_REQUEST_FILENAME))
+        return True
+    except FileNotFoundError:
+        return False
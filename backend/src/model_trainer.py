@@ -0,0 +1,84 @@
+import threading
+import time
+from datetime import datetime
+
+# Progress stages reported by AdvancedMarketingRecommender.retrain, in order
+TRAINING_STAGES = ("similarity model", "neighbour graph", "marketing patterns", "marketing stats", "saving artifacts", "publishing")
+
+
+class BackgroundTrainer:
+    """Builds the next model snapshot on a worker thread while the current one keeps serving
+
+    At most one retrain runs at a time; :meth:`status` reports its stage,
+    progress and outcome alongside the version currently being served.
+    """
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = None
+        self._status = {"state": "idle"}
+
+    def start(self, reason: str = "manual") -> bool:
+        """Start a retrain; returns False if one is already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+
+            self._started = time.perf_counter()
+            self._status = {
+                "state": "running",
+                "reason": reason,
+                "stage": "starting",
+                "progress": 0.0,
+                "started_at": datetime.utcnow().isoformat(),
+                "finished_at": None,
+                "elapsed_seconds": 0.0,
+                "error": None,
+            }
+            self._thread = threading.Thread(target=self._run, name="model-trainer", daemon=True)
+            self._thread.start()
+            return True
+
+    def _progress(self, stage: str):
+        with self._lock:
+            self._status["stage"] = stage
+            if stage in TRAINING_STAGES:
+                self._status["progress"] = round(TRAINING_STAGES.index(stage) / len(TRAINING_STAGES), 2)
+
+    def _run(self):
+        error = None
+        try:
+            success = self.recommender.retrain(progress=self._progress)
+        except Exception as e:
+            success = False
+            error = str(e)
+
+        with self._lock:
+            self._status.update({
+                "state": "succeeded" if success else "failed",
+                "stage": "done",
+                "progress": 1.0 if success else self._status["progress"],
+                "finished_at": datetime.utcnow().isoformat(),
+                "error": error,
+            })
+            self._status["elapsed_seconds"] = round(time.perf_counter() - self._started, 1)
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout: float = None):
+        """Block until the current retrain (if any) finishes"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            status = dict(self._status)
+            if status["state"] == "running":
+                status["elapsed_seconds"] = round(time.perf_counter() - self._started, 1)
+        status["serving_version"] = self.recommender.artifact_version
+        return status
@@ -0,0 +1,148 @@
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import IncrementalPCA
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[List]:
+    """Split a stream into lists of at most ``size`` items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingTfidfVectorizer:
+    """TF-IDF on top of a stateless hashing vectorizer, with IDF learned chunk by chunk
+
+    Call :meth:`partial_fit` on every chunk, then :meth:`finalize`. The
+    vocabulary is never stored, so memory does not grow with the corpus.
+    ``transform`` matches ``TfidfVectorizer.transform`` (smoothed IDF, l2 rows)
+    so query-time code can use either.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range=(1, 3), stop_words='english'):
+        self.n_features = n_features
+        self.hasher = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            stop_words=stop_words,
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
+        )
+        self.n_documents = 0
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.idf_ = None
+
+    def partial_fit(self, texts: List[str]):
+        counts = self.hasher.transform(texts)
+        # Hashed CSR rows hold each feature at most once, so this counts documents
+        self.document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_documents += counts.shape[0]
+        return self
+
+    def finalize(self):
+        self.idf_ = (np.log((1 + self.n_documents) / (1 + self.document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        vectors = self.hasher.transform(texts)
+        vectors.data *= self.idf_[vectors.indices]
+        return normalize(vectors, copy=False)
+
+
+class IncrementalHybridProjector:
+    """Streaming counterpart of the ``blockwise`` HybridProjector
+
+    The hashed TF-IDF block is first sketched to ``sketch_dim`` dense columns
+    with a fixed sparse random projection, then each block is reduced by its
+    own IncrementalPCA. Chunks smaller than the component count are buffered
+    until enough rows arrive. ``transform`` has the HybridProjector signature.
+    """
+
+    mode = 'incremental'
+
+    def __init__(self, n_components: int, n_tfidf_features: int, sketch_dim: int = 1024, random_state: int = 42):
+        self.n_components = n_components
+        tfidf_components = max(1, min(n_components // 2, sketch_dim))
+        embedding_components = max(1, n_components - tfidf_components)
+
+        self.sketch = SparseRandomProjection(n_components=sketch_dim, dense_output=True, random_state=random_state)
+        # The projection only depends on the input width
+        self.sketch.fit(sparse.csr_matrix((1, n_tfidf_features), dtype=np.float32))
+
+        self.tfidf_pca = IncrementalPCA(n_components=tfidf_components)
+        self.embedding_pca = IncrementalPCA(n_components=embedding_components)
+        self._pending = []
+        self._fitted = False
+
+    def _min_rows(self) -> int:
+        return max(self.tfidf_pca.n_components, self.embedding_pca.n_components)
+
+    def partial_fit(self, tfidf_vectors, sentence_vectors):
+        self._pending.append((
+            self.sketch.transform(tfidf_vectors).astype(np.float32, copy=False),
+            np.asarray(sentence_vectors, dtype=np.float32)
+        ))
+        if sum(len(block) for block, _ in self._pending) >= self._min_rows():
+            self._flush()
+        return self
+
+    def _flush(self):
+        tfidf_block = np.vstack([block for block, _ in self._pending])
+        embedding_block = np.vstack([block for _, block in self._pending])
+        self._pending = []
+        self.tfidf_pca.partial_fit(tfidf_block)
+        self.embedding_pca.partial_fit(embedding_block)
+        self._fitted = True
+
+    def finish_fit(self):
+        """Fit any buffered rows; a tail smaller than the component count is skipped"""
+        if self._pending and sum(len(block) for block, _ in self._pending) >= self._min_rows():
+            self._flush()
+        self._pending = []
+        if not self._fitted:
+            raise ValueError(f"Need at least {self._min_rows()} products to fit the incremental projection")
+        return self
+
+    def transform(self, tfidf_vectors, sentence_vectors) -> np.ndarray:
+        tfidf_reduced = self.tfidf_pca.transform(self.sketch.transform(tfidf_vectors))
+        embedding_reduced = self.embedding_pca.transform(np.asarray(sentence_vectors, dtype=np.float32))
+        return np.hstack([tfidf_reduced, embedding_reduced]).astype(np.float32, copy=False)
+
+
+class VectorFileWriter:
+    """Appends float32 rows to a raw file that is read back as a memmap
+
+    Rows go to a temporary file that replaces ``path`` on :meth:`close`, so
+    memmaps still open on the previous file keep their data.
+    """
+
+    def __init__(self, path: str, dim: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.rows = 0
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self._file.write(vectors.tobytes())
+        self.rows += len(vectors)
+
+    def close(self) -> np.ndarray:
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        if not self.rows:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
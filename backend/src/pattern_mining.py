@@ -0,0 +1,102 @@
+from typing import Dict, Iterable
+
+import pandas as pd
+
+# Defaults applied when a script is missing a field, matching the original
+# per-script ``dict.get`` fallbacks.
+SCRIPT_DEFAULTS = {
+    'tone': 'professional',
+    'platform': 'Instagram',
+    'content_structure': 'feature-benefit',
+}
+DEFAULT_SCORE = 6.0
+KEYWORD_MIN_SCORE = 6.0  # Medium-performing scripts
+
+
+def build_category_lookup(products: Iterable[Dict]) -> Dict[str, str]:
+    """Map every key a script may use to reference a product to its category
+
+    Scripts point at products either by the catalog ``product_id`` or by the
+    stringified ``_id``; both are indexed so the join is a single hash lookup.
+    """
+    lookup = {}
+    for product in products:
+        add_to_category_lookup(lookup, product)
+    return lookup
+
+
+def add_to_category_lookup(lookup: Dict[str, str], product: Dict):
+    """Index one product in a lookup built by :func:`build_category_lookup`"""
+    category = product.get('category', 'General')
+    lookup[str(product['_id'])] = category
+    if product.get('product_id') is not None:
+        lookup[str(product['product_id'])] = category
+
+
+def scripts_frame(scripts: Iterable[Dict], category_lookup: Dict[str, str]) -> pd.DataFrame:
+    """Columnar view of the scripts joined to their product category"""
+    columns = ['product_id', 'tone', 'platform', 'content_structure', 'performance_score', 'keywords']
+    df = pd.DataFrame.from_records(
+        (_script_record(script, columns) for script in scripts),
+        columns=columns
+    )
+    df['category'] = df['product_id'].map(category_lookup)
+    return df[df['product_id'].notna() & df['category'].notna()]
+
+
+def _script_record(script: Dict, columns) -> Dict:
+    record = {column: script.get(column) for column in columns}
+    # Stringified per value: integer ids next to missing ones would otherwise
+    # come back as a float column and stop matching the lookup keys ("1.0")
+    if record['product_id'] is not None:
+        record['product_id'] = str(record['product_id'])
+    return record
+
+
+def _top_by_category(df: pd.DataFrame, column: str, limit: int = None) -> Dict[str, Dict[str, float]]:
+    means = df.groupby(['category', column], sort=False)['score'].mean()
+    result = {}
+    for category, group in means.groupby(level=0, sort=False):
+        values = group.droplevel(0)
+        if limit is not None:
+            values = values.nlargest(limit)
+        result[category] = values.to_dict()
+    return result
+
+
+def compute_category_patterns(df: pd.DataFrame) -> Dict[str, Dict]:
+    """Tone, platform, structure and keyword statistics for every category in one pass"""
+    if df.empty:
+        return {}
+
+    df = df.assign(
+        tone=df['tone'].fillna(SCRIPT_DEFAULTS['tone']),
+        platform=df['platform'].fillna(SCRIPT_DEFAULTS['platform']),
+        content_structure=df['content_structure'].fillna(SCRIPT_DEFAULTS['content_structure']),
+        score=pd.to_numeric(df['performance_score'], errors='coerce').fillna(DEFAULT_SCORE)
+    )
+
+    best_tones = _top_by_category(df, 'tone', limit=3)
+    best_platforms = _top_by_category(df, 'platform', limit=3)
+    structures = _top_by_category(df, 'content_structure')
+
+    # Keywords of scripts that performed at least medium, counted per category
+    raw_scores = pd.to_numeric(df['performance_score'], errors='coerce').fillna(0)
+    keyword_rows = df.loc[raw_scores >= KEYWORD_MIN_SCORE, ['category', 'keywords']]
+    keyword_rows = keyword_rows[keyword_rows['keywords'].map(lambda k: isinstance(k, list))]
+    keywords = keyword_rows.explode('keywords').dropna(subset=['keywords'])
+    keyword_counts = keywords.groupby('category', sort=False)['keywords'].value_counts(sort=False)
+
+    top_keywords = {}
+    for category, counts in keyword_counts.groupby(level=0, sort=False):
+        top_keywords[category] = counts.droplevel(0).nlargest(10).index.tolist()
+
+    patterns = {}
+    for category in df['category'].unique():
+        patterns[category] = {
+            'top_keywords': top_keywords.get(category, []),
+            'structure_effectiveness': structures.get(category, {}),
+            'best_tones': best_tones.get(category, {}),
+            'best_platforms': best_platforms.get(category, {})
+        }
+    return patterns
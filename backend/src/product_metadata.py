@@ -0,0 +1,151 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Product fields kept as compact columns next to the vectors for filtered search
+METADATA_FIELDS = ['category', 'brand', 'price', 'target_audience']
+# Dictionary-encoded columns; code 0 is reserved for a missing value
+CATEGORICAL_FIELDS = ('category', 'brand', 'target_audience')
+# Keys accepted by ProductMetadata.select
+FILTER_FIELDS = CATEGORICAL_FIELDS + ('min_price', 'max_price')
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value).lower().split()) if value is not None else ""
+
+
+def _price(value) -> float:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return price if math.isfinite(price) else math.nan
+
+
+def active_filters(filters: Optional[Dict]) -> Dict:
+    """The filters that actually restrict results (unset and empty values dropped)"""
+    return {
+        field: value for field, value in (filters or {}).items()
+        if field in FILTER_FIELDS and value is not None and value != ""
+    }
+
+
+class ProductMetadata:
+    """Filter attributes of the indexed products, one row per index row
+
+    Category, brand and audience are dictionary-encoded into int32 code arrays
+    and price is a float32 column (NaN when unknown), so the columns cost 16
+    bytes per product and are memory-mapped with the rest of the bundle. Rows
+    are also partitioned by category, stored contiguously like the IVF lists,
+    so a category filter selects its rows without scanning the catalog.
+    Instances are never modified in place; :meth:`extend` returns a new one.
+    """
+
+    def __init__(self, codes: Dict[str, np.ndarray], vocabularies: Dict[str, List[str]], price: np.ndarray):
+        self.codes = codes
+        self.vocabularies = vocabularies
+        self.price = price
+        self._lookup = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in vocabularies.items()
+        }
+        self._build_partitions()
+
+    @classmethod
+    def from_products(cls, products: Iterable[Dict], vocabularies: Dict[str, List[str]] = None) -> "ProductMetadata":
+        builder = MetadataBuilder(vocabularies)
+        for product in products:
+            builder.append(product)
+        return builder.build()
+
+    def _build_partitions(self):
+        # Partition c is category_order[category_offsets[c]:category_offsets[c + 1]]
+        categories = self.codes['category']
+        self.category_order = np.argsort(categories, kind='stable').astype(np.int64)
+        counts = np.bincount(categories, minlength=len(self.vocabularies['category']))
+        self.category_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.price)
+
+    def extend(self, products: Iterable[Dict]) -> "ProductMetadata":
+        """New metadata with rows for ``products`` appended (rows added to the index)"""
+        added = ProductMetadata.from_products(products, self.vocabularies)
+        codes = {field: np.concatenate([self.codes[field], added.codes[field]]) for field in CATEGORICAL_FIELDS}
+        return ProductMetadata(codes, added.vocabularies, np.concatenate([self.price, added.price]))
+
+    def category_rows(self, category: str) -> np.ndarray:
+        code = self._lookup['category'].get(_normalize(category))
+        if not code:
+            return np.empty(0, dtype=np.int64)
+        return self.category_order[self.category_offsets[code]:self.category_offsets[code + 1]]
+
+    def select(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Sorted rows matching every filter, or None when nothing is filtered
+
+        Categorical filters match case- and whitespace-insensitively; price
+        bounds are inclusive and exclude products without a price. The
+        category partition is taken first and the remaining columns are only
+        read for its rows.
+        """
+        filters = active_filters(filters)
+        if not filters:
+            return None
+
+        rows = None
+        if 'category' in filters:
+            rows = self.category_rows(filters['category'])
+
+        for field in ('brand', 'target_audience'):
+            if field not in filters:
+                continue
+            code = self._lookup[field].get(_normalize(filters[field]))
+            if not code:
+                return np.empty(0, dtype=np.int64)
+            column = self.codes[field]
+            rows = np.flatnonzero(column == code) if rows is None else rows[column[rows] == code]
+
+        if 'min_price' in filters or 'max_price' in filters:
+            price = self.price if rows is None else self.price[rows]
+            keep = ~np.isnan(price)
+            # Bounds are compared at the column's float32 precision: float32(19.99) < 19.99
+            if 'min_price' in filters:
+                keep &= price >= np.float32(filters['min_price'])
+            if 'max_price' in filters:
+                keep &= price <= np.float32(filters['max_price'])
+            rows = np.flatnonzero(keep) if rows is None else rows[keep]
+
+        return rows.astype(np.int64, copy=False)
+
+
+class MetadataBuilder:
+    """Accumulates metadata rows one product at a time (e.g. while streaming the catalog)"""
+
+    def __init__(self, vocabularies: Dict[str, List[str]] = None):
+        self.vocabularies = {
+            field: list((vocabularies or {}).get(field, [""])) for field in CATEGORICAL_FIELDS
+        }
+        self._lookup = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self.vocabularies.items()
+        }
+        self._codes = {field: [] for field in CATEGORICAL_FIELDS}
+        self._price = []
+
+    def _encode(self, field: str, value) -> int:
+        value = _normalize(value)
+        lookup = self._lookup[field]
+        if value not in lookup:
+            lookup[value] = len(self.vocabularies[field])
+            self.vocabularies[field].append(value)
+        return lookup[value]
+
+    def append(self, product: Dict):
+        for field in CATEGORICAL_FIELDS:
+            self._codes[field].append(self._encode(field, product.get(field)))
+        self._price.append(_price(product.get('price')))
+
+    def build(self) -> ProductMetadata:
+        codes = {field: np.asarray(values, dtype=np.int32) for field, values in self._codes.items()}
+        return ProductMetadata(codes, self.vocabularies, np.asarray(self._price, dtype=np.float32))
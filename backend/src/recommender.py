@@ -5,32 +5,71 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import numpy as np
 import pandas as pd
 from pymongo import MongoClient
+from bson import ObjectId
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import TruncatedSVD
 from sklearn.cluster import KMeans
 from sentence_transformers import SentenceTransformer
 import spacy
 import joblib
 from config import Config
-from typing import List, Dict, Any, Tuple
+from src.hybrid_vectors import HybridProjector
+from src.ann_index import build_index
+from src.batching_encoder import BatchingEncoder
+from src.embedding_cache import EmbeddingCache
+from src import model_store, marketing_stats, pattern_mining
+from src.training_data import TrainingDataSource, SIMILARITY_PRODUCT_FIELDS, PATTERN_PRODUCT_FIELDS
+from src.out_of_core import iter_chunks, StreamingTfidfVectorizer, IncrementalHybridProjector, VectorFileWriter
+from src.model_snapshot import ModelSnapshot
+from src.product_metadata import ProductMetadata, MetadataBuilder, active_filters
+from src.knn_graph import KnnGraph
+from src.catalog_snapshot import collection_watermark
+from typing import List, Dict, Any, Tuple, Callable, Optional
 import re
+import copy
+import threading
+import time
 from collections import Counter
 import json
 from datetime import datetime
 
+SENTENCE_MODEL_NAME = 'all-MiniLM-L6-v2'
+
 class AdvancedMarketingRecommender:
-    def __init__(self):
+    def __init__(self, read_only: bool = None):
         self.client = MongoClient(Config.MONGO_URI)
         self.db = self.client[Config.DB_NAME]
         
+        # Worker processes only map snapshots published by the trainer process
+        self.read_only = Config.MODEL_ROLE == "worker" if read_only is None else read_only
+        
         # Initialize ML models
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=2000, 
-            stop_words='english',
-            ngram_range=(1, 3)
+        self.tfidf_vectorizer = self._create_tfidf_vectorizer()
+        self.sentence_model = SentenceTransformer(SENTENCE_MODEL_NAME)
+        
+        # Per-request encodes are coalesced into batched forward passes
+        self.query_encoder = BatchingEncoder(
+            self.sentence_model,
+            max_batch=Config.ENCODER_MAX_BATCH,
+            max_wait_ms=Config.ENCODER_MAX_WAIT_MS
+        )
+        
+        # Raw sentence embeddings only depend on the text, so they survive retrains;
+        # reduced query vectors are tied to the current model artifact version.
+        # The trainer process is the only writer of the shared disk tier: workers
+        # read its embeddings and keep their query vectors in memory.
+        self.embedding_cache = EmbeddingCache(
+            SENTENCE_MODEL_NAME,
+            dim=self.sentence_model.get_sentence_embedding_dimension(),
+            max_items=Config.EMBEDDING_CACHE_SIZE,
+            disk_dir=Config.EMBEDDING_CACHE_DIR or None,
+            read_only=self.read_only,
+            max_disk_rows=Config.EMBEDDING_CACHE_DISK_ROWS or None
+        )
+        self.query_cache = EmbeddingCache(
+            max_items=Config.EMBEDDING_CACHE_SIZE,
+            disk_dir=None if self.read_only else Config.EMBEDDING_CACHE_DIR or None,
+            max_disk_rows=Config.EMBEDDING_CACHE_DISK_ROWS or None
         )
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
         
         try:
             self.nlp = spacy.load("en_core_web_sm")
@@ -38,27 +77,58 @@ class AdvancedMarketingRecommender:
             print("⚠️  SpaCy model not found. Using basic preprocessing...")
             self.nlp = None
         
+        # Working state written by training; requests only read the published snapshot
+        self.snapshot = None
+        self._write_lock = threading.RLock()
+        self._published_stamp = None
+        
         # Model state
         self.models_trained = False
         self.product_vectors = None
         self.script_vectors = None
         self.product_ids = []
         self.script_data = []
+        self.svd = None
+        self.index = None
+        self.metadata = None
+        self.knn_graph = None
+        self.ungraphed_rows = {}
+        self.artifact_version = None
+        self.stats_materialized = False
+        
+        # Staleness of the similarity model: products it was fitted on vs. incremental changes since
+        self.fitted_products = 0
+        self.pending_changes = 0
+        self._product_rows = None
+        # Newest product ``_id``/``updated_at`` already indexed; later ones are picked up by sync_catalog_changes
+        self.catalog_watermark = None
+        self._unsaved_changes = False
+        self._last_saved = time.monotonic()
+        
+        # Callbacks invoked with the new version whenever the trained model changes
+        self.version_listeners = []
         
         # Pattern learning storage
         self.category_patterns = {}
         self.tone_effectiveness = {}
         self.platform_preferences = {}
         
+    @staticmethod
+    def _create_tfidf_vectorizer() -> TfidfVectorizer:
+        return TfidfVectorizer(
+            max_features=2000, 
+            stop_words='english',
+            ngram_range=(1, 3),
+            dtype=np.float32
+        )
+    
     def load_training_data(self):
         """Load and prepare data for model training"""
         print("📥 Loading training data...")
         
-        # Load products with extracted features
-        products = list(self.db.products.find({}))
-        
-        # Load marketing scripts with performance data
-        scripts = list(self.db.scripts.find({}))
+        data = TrainingDataSource(self.db)
+        products = list(data.products())
+        scripts = list(data.scripts())
         
         if not products:
             raise Exception("No products found in database. Please add products first.")
@@ -66,92 +136,249 @@ class AdvancedMarketingRecommender:
         print(f"✅ Loaded {len(products)} products and {len(scripts)} scripts")
         return products, scripts
     
-    def train_product_similarity_model(self):
+    def _product_training_inputs(self, products):
+        """One pass over streamed products: similarity texts, their ids, filter metadata and the category lookup"""
+        product_texts = []
+        product_ids = []
+        metadata = MetadataBuilder()
+        category_lookup = {}
+        
+        for product in products:
+            product_texts.append(self._training_text(product))
+            product_ids.append(str(product['_id']))
+            metadata.append(product)
+            pattern_mining.add_to_category_lookup(category_lookup, product)
+        
+        if not product_ids:
+            raise Exception("No products found in database. Please add products first.")
+        
+        print(f"✅ Loaded {len(product_ids)} products")
+        return product_texts, product_ids, metadata.build(), category_lookup
+    
+    def _training_text(self, product: Dict) -> str:
+        """Combine all product information into the preprocessed similarity text"""
+        features = " ".join(product.get('extracted_features', []))
+        combined_text = f"{product.get('name', '')} {product.get('category', '')} {product.get('description', '')} {features}"
+        return self.preprocess_text(combined_text)
+    
+    def train_product_similarity_model(self, product_texts: List[str] = None, product_ids: List[str] = None,
+                                       metadata: ProductMetadata = None):
         """Train model to find similar products"""
         print("🔄 Training product similarity model...")
         
-        products, _ = self.load_training_data()
+        if product_texts is None:
+            products = TrainingDataSource(self.db).products(SIMILARITY_PRODUCT_FIELDS)
+            product_texts, product_ids, metadata, _ = self._product_training_inputs(products)
         
-        if len(products) < 2:
+        if len(product_texts) < 2:
             print("⚠️  Not enough products for similarity model. Need at least 2 products.")
             # Create dummy data for testing
             self._create_fallback_models()
             return
         
-        # Create product feature vectors
-        product_texts = []
-        self.product_ids = []
-        
-        for product in products:
-            # Combine all product information
-            features = " ".join(product.get('extracted_features', []))
-            combined_text = f"{product.get('name', '')} {product.get('category', '')} {product.get('description', '')} {features}"
-            processed_text = self.preprocess_text(combined_text)
-            
-            product_texts.append(processed_text)
-            self.product_ids.append(str(product['_id']))
+        self.product_ids = list(product_ids)
+        # Without metadata every product is kept but none matches a filter
+        self.metadata = metadata or ProductMetadata.from_products({} for _ in product_ids)
+        self.tfidf_vectorizer = self._create_tfidf_vectorizer()
         
         # Train TF-IDF and create vectors
         try:
             tfidf_vectors = self.tfidf_vectorizer.fit_transform(product_texts)
             
-            # Add sentence embeddings for semantic similarity
-            sentence_vectors = self.sentence_model.encode(product_texts)
+            # Add sentence embeddings for semantic similarity (unchanged texts come from cache)
+            sentence_vectors = self.encode_texts(product_texts)
             
-            # Combine features
-            tfidf_dense = tfidf_vectors.toarray()
-            combined_vectors = np.concatenate([tfidf_dense, sentence_vectors], axis=1)
+            # Reduce both blocks without densifying the TF-IDF matrix
+            self.svd = HybridProjector(n_components=150, mode=Config.SIMILARITY_VECTOR_MODE)
+            self.product_vectors = self.svd.fit_transform(tfidf_vectors, sentence_vectors)
+            self.index = self._build_similarity_index(self.product_vectors)
+            # The index keeps pre-normalized float32 rows; share them rather than hold a second copy
+            self.product_vectors = self.index.vectors
+            self._mark_fitted(len(self.product_ids))
             
-            # Dimensionality reduction
-            self.svd = TruncatedSVD(n_components=min(150, len(products)-1), random_state=42)
-            self.product_vectors = self.svd.fit_transform(combined_vectors)
-            
-            print(f"✅ Product similarity model trained on {len(products)} products")
+            print(f"✅ Product similarity model trained on {len(product_texts)} products ({self.index.kind} index)")
         except Exception as e:
             print(f"❌ Error training similarity model: {e}")
             self._create_fallback_models()
     
+    def _use_out_of_core(self) -> bool:
+        if Config.TRAINING_MODE == "out_of_core":
+            return True
+        if Config.TRAINING_MODE == "auto":
+            return self.db.products.estimated_document_count() >= Config.OUT_OF_CORE_MIN_PRODUCTS
+        return False
+    
+    def train_product_similarity_model_out_of_core(self, data: TrainingDataSource = None):
+        """Train the similarity model in streaming passes for catalogs larger than memory
+        
+        Pass 1 learns IDF from hashed features and writes sentence embeddings to
+        disk (bypassing the embedding cache), pass 2 fits the incremental projection and pass 3 writes the
+        reduced float32 vectors to a memmap. Only one chunk of products is held
+        in memory at a time.
+        """
+        print("🔄 Training product similarity model out of core...")
+        data = data or TrainingDataSource(self.db)
+        vector_dir = os.path.join(Config.MODEL_DIR, "vectors")
+        
+        def chunks():
+            for products in iter_chunks(data.products(SIMILARITY_PRODUCT_FIELDS), Config.TRAINING_BATCH_SIZE):
+                ids = [str(product['_id']) for product in products]
+                yield ids, [self._training_text(product) for product in products], products
+        
+        def aligned_chunks(product_ids):
+            # Later passes must see the products in the order of the first one
+            start = 0
+            for ids, texts, _ in chunks():
+                if ids != product_ids[start:start + len(ids)]:
+                    raise Exception("Catalog changed while training out of core")
+                yield start, texts
+                start += len(ids)
+        
+        try:
+            vectorizer = StreamingTfidfVectorizer(n_features=Config.OUT_OF_CORE_HASH_FEATURES)
+            embeddings = VectorFileWriter(
+                os.path.join(vector_dir, "sentence_embeddings.f32"),
+                self.sentence_model.get_sentence_embedding_dimension()
+            )
+            product_ids = []
+            metadata = MetadataBuilder()
+            for ids, texts, products in chunks():
+                vectorizer.partial_fit(texts)
+                embeddings.write(self.encode_texts(texts, use_cache=False))
+                product_ids.extend(ids)
+                for product in products:
+                    metadata.append(product)
+                print(f"   Pass 1/3: {len(product_ids)} products hashed and encoded")
+            sentence_vectors = embeddings.close()
+            
+            if len(product_ids) < 2:
+                print("⚠️  Not enough products for similarity model. Need at least 2 products.")
+                self._create_fallback_models()
+                return
+            vectorizer.finalize()
+            
+            projector = IncrementalHybridProjector(
+                n_components=min(150, len(product_ids)),
+                n_tfidf_features=vectorizer.n_features
+            )
+            for start, texts in aligned_chunks(product_ids):
+                projector.partial_fit(vectorizer.transform(texts), sentence_vectors[start:start + len(texts)])
+            projector.finish_fit()
+            print("   Pass 2/3: incremental projection fitted")
+            
+            reduced = None
+            for start, texts in aligned_chunks(product_ids):
+                vectors = projector.transform(vectorizer.transform(texts), sentence_vectors[start:start + len(texts)])
+                if reduced is None:
+                    reduced = VectorFileWriter(os.path.join(vector_dir, "product_vectors.f32"), vectors.shape[1])
+                reduced.write(vectors)
+            
+            self.tfidf_vectorizer = vectorizer
+            self.svd = projector
+            self.product_vectors = reduced.close()
+            self.product_ids = product_ids
+            self.metadata = metadata.build()
+            self.index = self._build_similarity_index(self.product_vectors)
+            # The index keeps pre-normalized float32 rows; share them rather than hold a second copy
+            self.product_vectors = self.index.vectors
+            self._mark_fitted(len(product_ids))
+            print(f"✅ Product similarity model trained out of core on {len(product_ids)} products ({self.index.kind} index)")
+        except Exception as e:
+            print(f"❌ Error training similarity model out of core: {e}")
+            self._create_fallback_models()
+    
+    def encode_texts(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Sentence embeddings for ``texts``, encoding only those not cached yet
+        
+        Bulk encodes of a whole catalog pass ``use_cache=False``: they would
+        only churn the cache and its disk tier.
+        """
+        if not use_cache:
+            return np.asarray(self.sentence_model.encode(texts), dtype=np.float32)
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [i for i in range(len(texts)) if i not in vectors]
+        
+        if missing:
+            print(f"   Encoding {len(missing)} of {len(texts)} texts ({len(texts) - len(missing)} cached)")
+            encoded = self.sentence_model.encode([texts[i] for i in missing])
+            self.embedding_cache.put_many([texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        
+        return np.vstack([vectors[i] for i in range(len(texts))])
+    
     def _create_fallback_models(self):
         """Create fallback models when there's insufficient data"""
         print("🔄 Creating fallback models...")
         
-        # Create dummy product vectors for basic functionality
-        self.product_vectors = np.random.rand(2, 10)
-        self.product_ids = ['dummy_1', 'dummy_2']
-        self.svd = TruncatedSVD(n_components=10, random_state=42)
-        self.svd.fit(self.product_vectors)
-        
         # Create basic TF-IDF vectorizer
+        self.tfidf_vectorizer = self._create_tfidf_vectorizer()
         dummy_texts = ["product electronics tech", "fashion clothing style"]
-        self.tfidf_vectorizer.fit(dummy_texts)
+        tfidf_vectors = self.tfidf_vectorizer.fit_transform(dummy_texts)
+        
+        # Create dummy product vectors for basic functionality
+        embedding_dim = self.sentence_model.get_sentence_embedding_dimension()
+        self.product_ids = ['dummy_1', 'dummy_2']
+        self.metadata = ProductMetadata.from_products([{}, {}])
+        self.svd = HybridProjector(n_components=10, mode=Config.SIMILARITY_VECTOR_MODE)
+        self.product_vectors = self.svd.fit_transform(tfidf_vectors, np.random.rand(2, embedding_dim))
+        self.index = build_index(self.product_vectors, 'exact')
+        self.knn_graph = None
+        self.ungraphed_rows = {}
+        self._mark_fitted(0)
         
         print("✅ Fallback models created")
     
-    def train_marketing_pattern_model(self):
+    def _build_similarity_index(self, vectors):
+        """Build the configured nearest-neighbour index over product vectors"""
+        kind = Config.SIMILARITY_INDEX
+        if len(vectors) < Config.SIMILARITY_INDEX_MIN_PRODUCTS:
+            kind = 'exact'
+        
+        params = {
+            'quantize': Config.VECTOR_QUANTIZATION == 'int8',
+            'rerank_factor': Config.RERANK_FACTOR
+        }
+        if kind == 'ivf':
+            params['nprobe'] = Config.IVF_NPROBE
+        return build_index(vectors, kind, **params)
+    
+    def _build_knn_graph(self):
+        """Precompute the nearest neighbours of every product in the freshly fitted index"""
+        if Config.KNN_GRAPH_NEIGHBORS <= 0 or self.fitted_products == 0:
+            return None
+        try:
+            graph = KnnGraph.build(self.index, self.product_ids, Config.KNN_GRAPH_NEIGHBORS)
+            print(f"✅ Neighbour graph built ({graph.k} neighbours for {len(graph)} products)")
+            return graph
+        except Exception as e:
+            # Lookups by id fall back to searching the index
+            print(f"⚠️  Could not build neighbour graph: {e}")
+            return None
+    
+    def _ungraphed_product_rows(self) -> Dict[str, int]:
+        """Live rows outside the neighbour graph (all of them without one), by product id"""
+        if self.index is None:
+            return {}
+        start = len(self.knn_graph) if self.knn_graph is not None else 0
+        removed = self.index.removed
+        return {
+            str(self.product_ids[row]): row for row in range(start, len(self.product_ids)) if not removed[row]
+        }
+    
+    def train_marketing_pattern_model(self, category_lookup: Dict[str, str] = None, scripts=None):
         """Train model to learn successful marketing patterns"""
         print("🎯 Training marketing pattern model...")
         
-        products, scripts = self.load_training_data()
+        if category_lookup is None:
+            data = TrainingDataSource(self.db)
+            category_lookup = pattern_mining.build_category_lookup(data.products(PATTERN_PRODUCT_FIELDS))
+            scripts = data.scripts()
         
-        # Analyze successful patterns by category
-        self.category_patterns = {}
-        
-        categories = set(p.get('category', 'General') for p in products)
-        
-        for category in categories:
-            # Get scripts for this category
-            category_scripts = []
-            for script in scripts:
-                product_id = script.get('product_id')
-                if not product_id:
-                    continue
-                    
-                product = next((p for p in products if str(p['_id']) == str(product_id)), None)
-                if product and product.get('category') == category:
-                    category_scripts.append(script)
-            
-            if category_scripts:
-                self.analyze_category_patterns(category, category_scripts)
+        # Hash join streamed scripts to product categories, then analyze all categories at once
+        self.category_patterns = pattern_mining.compute_category_patterns(
+            pattern_mining.scripts_frame(scripts, category_lookup)
+        )
         
         # If no category patterns found, create general patterns
         if not self.category_patterns:
@@ -161,88 +388,457 @@ class AdvancedMarketingRecommender:
     
     def analyze_category_patterns(self, category: str, scripts: List[Dict]):
         """Analyze successful marketing patterns for a specific category"""
+        df = pattern_mining.scripts_frame(
+            scripts, {str(s.get('product_id')): category for s in scripts}
+        )
+        self.category_patterns.update(pattern_mining.compute_category_patterns(df))
+    
+    def train_models(self, progress: Callable[[str], None] = None, save: bool = False) -> bool:
+        """Train all ML models and publish them as the next snapshot
+        
+        The previous snapshot keeps serving until training completes; if
+        training fails it stays published. With ``save`` the snapshot is
+        persisted before it is published, under the same lock, so no
+        incremental change can land between the fit and the save.
+        """
+        progress = progress or (lambda stage: None)
+        if self.read_only:
+            print("⚠️  Worker processes never train; waiting for the trainer to publish models")
+            return False
         
-        # Tone effectiveness
-        tone_scores = {}
-        for script in scripts:
-            tone = script.get('tone', 'professional')
-            score = script.get('performance_score', 6.0)  # Default score
-            if tone not in tone_scores:
-                tone_scores[tone] = []
-            tone_scores[tone].append(score)
-        
-        # Calculate average performance per tone
-        tone_effectiveness = {}
-        for tone, scores in tone_scores.items():
-            tone_effectiveness[tone] = np.mean(scores)
-        
-        # Platform preferences
-        platform_scores = {}
-        for script in scripts:
-            platform = script.get('platform', 'Instagram')
-            score = script.get('performance_score', 6.0)
-            if platform not in platform_scores:
-                platform_scores[platform] = []
-            platform_scores[platform].append(score)
-        
-        platform_preferences = {}
-        for platform, scores in platform_scores.items():
-            platform_preferences[platform] = np.mean(scores)
-        
-        # Content structure effectiveness
-        structure_scores = {}
-        for script in scripts:
-            structure = script.get('content_structure', 'feature-benefit')
-            score = script.get('performance_score', 6.0)
-            if structure not in structure_scores:
-                structure_scores[structure] = []
-            structure_scores[structure].append(score)
-        
-        structure_effectiveness = {}
-        for structure, scores in structure_scores.items():
-            structure_effectiveness[structure] = np.mean(scores)
-        
-        # Successful keywords
-        all_keywords = []
-        for script in scripts:
-            if script.get('performance_score', 0) >= 6.0:  # Medium-performing scripts
-                keywords = script.get('keywords', [])
-                if isinstance(keywords, list):
-                    all_keywords.extend(keywords)
-        
-        keyword_counts = Counter(all_keywords)
-        top_keywords = [kw for kw, count in keyword_counts.most_common(10)]
-        
-        # Store patterns
-        self.category_patterns[category] = {
-            'top_keywords': top_keywords,
-            'structure_effectiveness': structure_effectiveness,
-            'best_tones': dict(sorted(tone_effectiveness.items(), key=lambda x: x[1], reverse=True)[:3]),
-            'best_platforms': dict(sorted(platform_preferences.items(), key=lambda x: x[1], reverse=True)[:3])
+        with self._write_lock:
+            print("🚀 Training complete recommendation system...")
+            
+            try:
+                # Each collection is streamed once, with only the fields training reads
+                data = TrainingDataSource(self.db)
+                # Taken before streaming, so products written meanwhile are synced afterwards
+                watermark = collection_watermark(self.db.products)
+                progress("similarity model")
+                if self._use_out_of_core():
+                    self.train_product_similarity_model_out_of_core(data)
+                    category_lookup = pattern_mining.build_category_lookup(data.products(PATTERN_PRODUCT_FIELDS))
+                else:
+                    product_texts, product_ids, metadata, category_lookup = self._product_training_inputs(data.products())
+                    self.train_product_similarity_model(product_texts, product_ids, metadata)
+                    del product_texts
+                progress("neighbour graph")
+                self.knn_graph = self._build_knn_graph()
+                self.ungraphed_rows = self._ungraphed_product_rows()
+                self.catalog_watermark = watermark
+                progress("marketing patterns")
+                self.train_marketing_pattern_model(category_lookup, data.scripts())
+                progress("marketing stats")
+                self.refresh_marketing_stats_table()
+                if self.fitted_products == 0:
+                    # Too few products for a real model: serve the fallback, but report failure so it is never saved
+                    progress("publishing")
+                    self._publish(f"fallback:{datetime.utcnow().isoformat()}")
+                    print("⚠️  Only fallback models could be trained")
+                    return False
+                
+                snapshot = self._working_snapshot()
+                if save:
+                    progress("saving artifacts")
+                # A successful save publishes the snapshot under its bundle version
+                if not (save and self.save_artifacts(snapshot=snapshot, progress=progress)):
+                    progress("publishing")
+                    self._publish(f"trained:{datetime.utcnow().isoformat()}", snapshot=snapshot)
+                print("✅ All models trained successfully!")
+                return True
+            except Exception as e:
+                print(f"❌ Model training failed: {e}")
+                if self.snapshot is not None:
+                    print("↩️  Keeping the previous model snapshot")
+                    self._adopt(self.snapshot)
+                else:
+                    # Even if training fails, serve fallback models
+                    if self.index is None:
+                        self._create_fallback_models()
+                    self._publish(f"fallback:{datetime.utcnow().isoformat()}")
+                return False
+    
+    def retrain(self, progress: Callable[[str], None] = None) -> bool:
+        """Train the next snapshot and persist it, e.g. from the background trainer"""
+        return self.train_models(progress, save=True)
+    
+    def _publish(self, version: str, reset_query_cache: bool = True, snapshot: ModelSnapshot = None):
+        """Atomically swap in a new snapshot (by default built from the working state)
+        
+        Requests holding the previous snapshot finish on it undisturbed.
+        Incremental catalog changes keep the fitted projection, so they pass
+        ``reset_query_cache=False`` and cached query vectors stay valid.
+        """
+        previous = self.snapshot
+        projection_version = version if reset_query_cache or previous is None else previous.projection_version
+        
+        if snapshot is None:
+            snapshot = self._working_snapshot()
+        snapshot = snapshot._replace(version=version, projection_version=projection_version)
+        
+        if reset_query_cache:
+            dim = snapshot.product_vectors.shape[1] if snapshot.product_vectors is not None else None
+            self.query_cache.reset(projection_version, dim=dim, discard_previous=True)
+        
+        self.snapshot = snapshot
+        self.artifact_version = version
+        self.models_trained = True
+        for listener in self.version_listeners:
+            listener(version)
+    
+    def _working_snapshot(self) -> ModelSnapshot:
+        """Snapshot of the working state; :meth:`_publish` stamps its version"""
+        return ModelSnapshot(
+            version=None,
+            projection_version=None,
+            tfidf_vectorizer=self.tfidf_vectorizer,
+            svd=self.svd,
+            product_vectors=self.product_vectors,
+            product_ids=self.product_ids,
+            index=self.index,
+            metadata=self.metadata,
+            knn_graph=self.knn_graph,
+            ungraphed_rows=self.ungraphed_rows,
+            category_patterns=self.category_patterns,
+            fitted_products=self.fitted_products,
+            pending_changes=self.pending_changes,
+            catalog_watermark=self.catalog_watermark
+        )
+    
+    def _adopt(self, snapshot: ModelSnapshot):
+        """Reset the working state to a published snapshot (after a failed training run)"""
+        self.tfidf_vectorizer = snapshot.tfidf_vectorizer
+        self.svd = snapshot.svd
+        self.product_vectors = snapshot.product_vectors
+        self.product_ids = snapshot.product_ids
+        self.index = snapshot.index
+        self.metadata = snapshot.metadata
+        self.knn_graph = snapshot.knn_graph
+        self.ungraphed_rows = snapshot.ungraphed_rows
+        self.category_patterns = snapshot.category_patterns
+        self.fitted_products = snapshot.fitted_products
+        self.pending_changes = snapshot.pending_changes
+        self.catalog_watermark = snapshot.catalog_watermark
+        self._product_rows = None
+    
+    def current_patterns(self) -> Dict[str, Dict]:
+        """Category patterns of the published snapshot"""
+        snapshot = self.snapshot
+        return snapshot.category_patterns if snapshot is not None else self.category_patterns
+    
+    def refresh_marketing_stats_table(self):
+        """Rebuild the materialized per-product marketing stats"""
+        try:
+            rows = marketing_stats.rebuild_marketing_stats(self.db)
+            self.stats_materialized = True
+            print(f"✅ Marketing stats materialized for {rows} products")
+        except Exception as e:
+            # Stats are still computed live from scripts, just slower
+            print(f"⚠️  Could not materialize marketing stats: {e}")
+            self.stats_materialized = False
+    
+    def get_artifact_bundle(self, snapshot: ModelSnapshot = None) -> Dict:
+        """Collect the published (or given) snapshot's state that is persisted between restarts"""
+        snapshot = snapshot or self.snapshot
+        return {
+            'tfidf_vectorizer': snapshot.tfidf_vectorizer,
+            'svd': snapshot.svd,
+            'product_vectors': snapshot.product_vectors,
+            # Fixed-width string array instead of a list, so it is memory-mapped on load too
+            'product_ids': np.asarray(snapshot.product_ids, dtype=str),
+            'index': snapshot.index,
+            'metadata': snapshot.metadata,
+            'knn_graph': snapshot.knn_graph,
+            'category_patterns': snapshot.category_patterns,
+            'fitted_products': snapshot.fitted_products,
+            'pending_changes': snapshot.pending_changes,
+            'catalog_watermark': snapshot.catalog_watermark
         }
     
-    def train_models(self):
-        """Train all ML models"""
-        print("🚀 Training complete recommendation system...")
+    def apply_artifact_bundle(self, bundle: Dict):
+        """Restore trained state from a bundle produced by get_artifact_bundle and publish it"""
+        with self._write_lock:
+            self.tfidf_vectorizer = bundle['tfidf_vectorizer']
+            self.svd = bundle['svd']
+            self.product_vectors = bundle['product_vectors']
+            self.product_ids = bundle['product_ids']
+            self.index = bundle['index']
+            self.metadata = bundle['metadata']
+            self.knn_graph = bundle['knn_graph']
+            self.ungraphed_rows = self._ungraphed_product_rows()
+            self.category_patterns = bundle['category_patterns']
+            self.fitted_products = bundle['fitted_products']
+            self.pending_changes = bundle['pending_changes']
+            self.catalog_watermark = bundle['catalog_watermark']
+            self._product_rows = None
+            self._unsaved_changes = False
+            self.stats_materialized = marketing_stats.is_materialized(self.db)
+            self._publish(f"{bundle['fingerprint']}:{bundle['created_at']}")
+    
+    def load_saved_models(self) -> bool:
+        """Publish the saved artifacts even if the catalog has changed since
+        
+        Lets a server answer from the previous model while the next one trains.
+        Returns True only if artifacts were loaded and match the current catalog.
+        """
+        stamp = model_store.bundle_stamp()
+        bundle = model_store.load_bundle()
+        if not bundle:
+            return False
         
+        self.apply_artifact_bundle(bundle)
+        self._published_stamp = stamp
+        print(f"✅ Loaded model artifacts for {len(self.product_ids)} products from disk")
         try:
-            self.train_product_similarity_model()
-            self.train_marketing_pattern_model()
-            self.models_trained = True
-            print("✅ All models trained successfully!")
-            return True
+            return bundle['fingerprint'] == model_store.catalog_fingerprint(self.db)
         except Exception as e:
-            print(f"❌ Model training failed: {e}")
-            # Even if training fails, mark as trained with fallback models
-            self.models_trained = True
+            print(f"⚠️  Could not fingerprint catalog: {e}")
+            return False
+    
+    def reload_published_models(self) -> bool:
+        """Swap in the bundle on disk if the trainer published a new one since the last load"""
+        stamp = model_store.bundle_stamp()
+        if stamp is None or stamp == self._published_stamp:
             return False
+        
+        bundle = model_store.load_bundle()
+        if not bundle:
+            return False
+        
+        self.apply_artifact_bundle(bundle)
+        self._published_stamp = stamp
+        print(f"🔄 Loaded newly published models for {len(self.product_ids)} products")
+        return True
+    
+    def save_artifacts(self, fingerprint: str = None, reset_query_cache: bool = True,
+                       snapshot: ModelSnapshot = None, progress: Callable[[str], None] = None) -> bool:
+        """Persist the published snapshot (or a freshly trained one) and publish it under its bundle version
+        
+        Holds the write lock, so the saved bundle is exactly what gets published.
+        ``progress`` is told "publishing" once the bundle is saved, right before the swap.
+        """
+        with self._write_lock:
+            try:
+                snapshot = snapshot or self.snapshot
+                if snapshot.fitted_products == 0:
+                    # Fallback models are not worth persisting, the next boot should retry
+                    print("⚠️  Not saving fallback models")
+                    return False
+                fingerprint = fingerprint or model_store.catalog_fingerprint(self.db)
+                saved = model_store.save_bundle(self.get_artifact_bundle(snapshot), fingerprint)
+                self._published_stamp = model_store.bundle_stamp()
+                if progress:
+                    progress("publishing")
+                self._publish(f"{saved['fingerprint']}:{saved['created_at']}", reset_query_cache, snapshot)
+                self._unsaved_changes = False
+                self._last_saved = time.monotonic()
+                print(f"💾 Model artifacts saved to {model_store.artifact_path()}")
+                return True
+            except Exception as e:
+                print(f"⚠️  Could not save model artifacts: {e}")
+                return False
+    
+    def _mark_fitted(self, product_count: int):
+        """Record a full fit of the similarity model; incremental changes start from zero"""
+        self.fitted_products = product_count
+        self.pending_changes = 0
+        self._product_rows = None
+    
+    def catalog_drift(self) -> float:
+        """Share of the fitted catalog added, changed or removed since the last full fit"""
+        return self.pending_changes / max(self.fitted_products, 1)
+    
+    def _live_product_rows(self) -> Dict[str, int]:
+        if self._product_rows is None:
+            removed = self.index.removed
+            self._product_rows = {
+                product_id: row for row, product_id in enumerate(self.product_ids) if not removed[row]
+            }
+        return self._product_rows
+    
+    def add_products(self, products: List[Dict], persist: bool = True) -> Dict[str, Any]:
+        """Make new or changed products searchable without retraining
+        
+        Products are projected with the fitted vectorizer and projection and
+        appended to the vectors, ids and index; an already indexed ``_id`` is
+        replaced. Once changes since the last full fit exceed
+        ``INCREMENTAL_REFIT_THRESHOLD`` of the catalog, a full retrain runs instead.
+        With ``persist`` the bundle is saved at most every
+        ``INCREMENTAL_SAVE_SECONDS``; see :meth:`flush_incremental_changes`.
+        """
+        if self.read_only:
+            raise RuntimeError("Catalog updates must go through the trainer process")
+        
+        with self._write_lock:
+            if self.snapshot is None or self.fitted_products == 0:
+                return self._refit_after_changes(persist)
+            
+            # Last write wins for duplicate ids within the batch
+            products = {str(p['_id']): p for p in products if p.get('_id') is not None}
+            if not products:
+                return {"added": 0, "updated": 0, "drift": self.catalog_drift(), "refit": False}
+            
+            ids = list(products)
+            texts = [self._training_text(product) for product in products.values()]
+            vectors = self.svd.transform(self.tfidf_vectorizer.transform(texts), self.encode_texts(texts))
+            
+            # The published index is shared with readers; change a copy (add/remove never write arrays in place)
+            self.index = copy.copy(self.index)
+            rows = self._live_product_rows()
+            replaced = [rows[product_id] for product_id in ids if product_id in rows]
+            if replaced:
+                self.index.remove(replaced)
+            
+            start = len(self.product_ids)
+            self.product_ids = list(self.product_ids) + ids
+            self.metadata = self.metadata.extend(products.values())
+            self.index.add(vectors)
+            added = {product_id: start + offset for offset, product_id in enumerate(ids)}
+            rows.update(added)
+            # Published snapshots share the old mapping, so derive a new one
+            self.ungraphed_rows = {**self.ungraphed_rows, **added}
+            
+            self.pending_changes += len(ids)
+            return self._after_incremental_change(
+                {"added": len(ids) - len(replaced), "updated": len(replaced)}, persist
+            )
+    
+    def remove_products(self, product_ids: List[str], persist: bool = True) -> Dict[str, Any]:
+        """Stop returning the given products from similarity search"""
+        if self.read_only:
+            raise RuntimeError("Catalog updates must go through the trainer process")
+        
+        with self._write_lock:
+            if self.snapshot is None or self.fitted_products == 0:
+                return self._refit_after_changes(persist)
+            
+            rows = self._live_product_rows()
+            removed = [rows.pop(str(product_id)) for product_id in product_ids if str(product_id) in rows]
+            if removed:
+                self.index = copy.copy(self.index)
+                self.index.remove(removed)
+                self.pending_changes += len(removed)
+                gone = {str(product_id) for product_id in product_ids}
+                self.ungraphed_rows = {
+                    product_id: row for product_id, row in self.ungraphed_rows.items() if product_id not in gone
+                }
+            return self._after_incremental_change({"removed": len(removed)}, persist)
+    
+    def _after_incremental_change(self, summary: Dict[str, Any], persist: bool) -> Dict[str, Any]:
+        drift = self.catalog_drift()
+        if drift > Config.INCREMENTAL_REFIT_THRESHOLD:
+            print(f"🔄 Catalog drift {drift:.1%} exceeds {Config.INCREMENTAL_REFIT_THRESHOLD:.0%}, retraining...")
+            return {**summary, **self._refit_after_changes(persist)}
+        
+        base_version = (self.artifact_version or "").split("+")[0]
+        self._publish(f"{base_version}+{self.pending_changes}", reset_query_cache=False)
+        self._unsaved_changes = True
+        if persist:
+            self.flush_incremental_changes(force=False)
+        return {**summary, "drift": round(drift, 4), "refit": False}
+    
+    def flush_incremental_changes(self, force: bool = True) -> bool:
+        """Save incremental changes not persisted yet
+        
+        Rewriting the bundle costs as much as the whole catalog, so changes are
+        batched: without ``force`` nothing is written until
+        ``INCREMENTAL_SAVE_SECONDS`` have passed since the last save.
+        """
+        with self._write_lock:
+            if not self._unsaved_changes:
+                return False
+            if not force and time.monotonic() - self._last_saved < Config.INCREMENTAL_SAVE_SECONDS:
+                return False
+            return self.save_artifacts(reset_query_cache=False)
+    
+    def sync_catalog_changes(self) -> Dict[str, Any]:
+        """Index the products inserted or changed in Mongo since the last fit or sync
+        
+        Only documents newer than the stored watermark (by ``_id`` or
+        ``updated_at``) are read, in batches. Deletions leave no trace there;
+        they are applied through :meth:`sync_products`.
+        """
+        if self.read_only:
+            raise RuntimeError("Catalog updates must go through the trainer process")
+        
+        with self._write_lock:
+            summary = {"added": 0, "updated": 0, "refit": False}
+            if self.snapshot is None or self.fitted_products == 0 or not self.catalog_watermark:
+                return summary
+            
+            watermark = collection_watermark(self.db.products)
+            previous = self.catalog_watermark
+            if watermark == previous:
+                return summary
+            
+            delta = [{"_id": {"$gt": self._to_object_id(previous["max_id"])}}] if previous.get("max_id") else []
+            if previous.get("max_updated_at"):
+                delta.append({"updated_at": {"$gt": datetime.fromisoformat(previous["max_updated_at"])}})
+            else:
+                delta.append({"updated_at": {"$exists": True}})
+            
+            projection = {field: 1 for field in SIMILARITY_PRODUCT_FIELDS}
+            cursor = self.db.products.find({"$or": delta}, projection).batch_size(Config.TRAINING_BATCH_SIZE)
+            for batch in iter_chunks(cursor, Config.TRAINING_BATCH_SIZE):
+                result = self.add_products(batch)
+                if result["refit"]:
+                    # The retrain read the whole catalog and took its own watermark
+                    return {**summary, **result}
+                summary["added"] += result["added"]
+                summary["updated"] += result["updated"]
+            
+            self.catalog_watermark = watermark
+            self._publish(self.artifact_version, reset_query_cache=False,
+                          snapshot=self.snapshot._replace(catalog_watermark=watermark))
+            self._unsaved_changes = True
+            if summary["added"] or summary["updated"]:
+                print(f"🔄 Synced {summary['added']} new and {summary['updated']} changed products")
+            return {**summary, "drift": round(self.catalog_drift(), 4)}
+    
+    def sync_products(self, product_ids: List[str]) -> Dict[str, Any]:
+        """Re-read the given products from Mongo: index the current ones, drop deleted ones"""
+        if self.read_only:
+            raise RuntimeError("Catalog updates must go through the trainer process")
+        
+        product_ids = [str(product_id) for product_id in product_ids]
+        projection = {field: 1 for field in SIMILARITY_PRODUCT_FIELDS}
+        found = list(self.db.products.find(
+            {"_id": {"$in": [self._to_object_id(product_id) for product_id in product_ids]}}, projection
+        ))
+        found_ids = {str(product['_id']) for product in found}
+        missing = [product_id for product_id in product_ids if product_id not in found_ids]
+        
+        with self._write_lock:
+            summary = self.add_products(found) if found else {}
+            if missing and not summary.get("refit"):
+                summary = {**summary, **self.remove_products(missing)}
+            return summary
     
-    def find_similar_products(self, input_product: Dict[str, Any], top_n: int = 5) -> List[Dict]:
-        """Find similar products using advanced ML similarity"""
-        if not self.models_trained:
+    def _refit_after_changes(self, persist: bool) -> Dict[str, Any]:
+        success = self.retrain() if persist else self.train_models()
+        return {"drift": 0.0, "refit": True, "success": success}
+    
+    def find_similar_products(self, input_product: Dict[str, Any], top_n: int = 5,
+                              filters: Dict[str, Any] = None) -> List[Dict]:
+        """Find similar products using advanced ML similarity
+        
+        ``filters`` (category, brand, target_audience, min_price, max_price)
+        restrict the candidates before any vector is scored.
+        """
+        if self.snapshot is None and not self.models_trained:
             success = self.train_models()
             if not success:
-                return self._get_fallback_similar_products(input_product, top_n)
+                return self._get_fallback_similar_products(input_product, top_n, filters)
+        
+        # One consistent model for the whole request, even if a new snapshot is published meanwhile
+        snapshot = self.snapshot
+        if snapshot is None:
+            return self._get_fallback_similar_products(input_product, top_n, filters)
+        
+        # Resolve filters to index rows from the metadata columns
+        allowed_rows = snapshot.metadata.select(filters)
+        if allowed_rows is not None and len(allowed_rows) == 0:
+            return []
         
         # Prepare input product vector
         input_features = " ".join(input_product.get('extracted_features', []))
@@ -250,56 +846,114 @@ class AdvancedMarketingRecommender:
         processed_input = self.preprocess_text(input_text)
         
         try:
-            # Transform input
-            tfidf_vector = self.tfidf_vectorizer.transform([processed_input])
-            sentence_vector = self.sentence_model.encode([processed_input])
+            # Reuse the reduced vector if this text was seen under the current projection
+            cache_key = f"{snapshot.projection_version}\n{processed_input}"
+            input_reduced = self.query_cache.get(cache_key)
             
-            # Combine and reduce dimensions
-            tfidf_dense = tfidf_vector.toarray()
-            combined_input = np.concatenate([tfidf_dense, sentence_vector], axis=1)
-            input_reduced = self.svd.transform(combined_input)
+            if input_reduced is None:
+                # Transform input
+                tfidf_vector = snapshot.tfidf_vectorizer.transform([processed_input])
+                sentence_vector = self.query_encoder.encode([processed_input])
+                
+                # Reduce dimensions through the same projection used in training
+                input_reduced = snapshot.svd.transform(tfidf_vector, sentence_vector)[0]
+                self.query_cache.put(cache_key, input_reduced)
             
-            # Calculate similarities
-            similarities = cosine_similarity(input_reduced, self.product_vectors).flatten()
+            # Get top similar products from the nearest-neighbour index, scoring only allowed rows
+            top_indices, scores = snapshot.index.search(input_reduced, top_n, allowed_rows)
             
-            # Get top similar products
-            top_indices = similarities.argsort()[-top_n:][::-1]
+            hits = []
+            for idx, similarity in zip(top_indices, scores):
+                product_id = snapshot.product_ids[idx]
+                # Lower similarity threshold, and skip dummy products
+                if similarity > 0.1 and not product_id.startswith('dummy_'):
+                    hits.append((product_id, float(similarity)))
             
-            similar_products = []
-            for idx in top_indices:
-                if similarities[idx] > 0.1:  # Lower similarity threshold
-                    product_id = self.product_ids[idx]
-                    
-                    # Skip dummy products
-                    if product_id.startswith('dummy_'):
-                        continue
-                        
-                    # Get original product data
-                    original_product = self.db.products.find_one({"_id": product_id})
-                    if original_product:
-                        # Get marketing performance for this product
-                        marketing_stats = self.get_product_marketing_stats(product_id)
-                        
-                        similar_products.append({
-                            'product': original_product,
-                            'similarity': float(similarities[idx]),
-                            'marketing_stats': marketing_stats,
-                            'shared_features': self.find_shared_features(input_product, original_product)
-                        })
-            
-            return similar_products[:top_n]
+            return self._hydrate_hits(hits, input_product)[:top_n]
         except Exception as e:
             print(f"❌ Error finding similar products: {e}")
-            return self._get_fallback_similar_products(input_product, top_n)
+            return self._get_fallback_similar_products(input_product, top_n, filters)
+    
+    def _hydrate_hits(self, hits: List[Tuple[str, float]], input_product: Dict) -> List[Dict]:
+        """Turn (product id, similarity) hits into results with one product fetch and one stats aggregation"""
+        hit_ids = [self._to_object_id(product_id) for product_id, _ in hits]
+        products_by_id = {p['_id']: p for p in self.db.products.find({"_id": {"$in": hit_ids}})}
+        stats_by_id = self.get_products_marketing_stats(list(products_by_id.values()))
+        
+        similar_products = []
+        for object_id, (_, similarity) in zip(hit_ids, hits):
+            original_product = products_by_id.get(object_id)
+            if original_product:
+                similar_products.append({
+                    'product': original_product,
+                    'similarity': similarity,
+                    'marketing_stats': stats_by_id[object_id],
+                    'shared_features': self.find_shared_features(input_product, original_product)
+                })
+        
+        return similar_products
+    
+    def find_similar_to_product(self, product_id: str, top_n: int = 5) -> Optional[Tuple[Dict, List[Dict]]]:
+        """(product, similar products) for a catalog product, without model inference
+        
+        Neighbours come from the precomputed graph. Products added since the
+        last full fit, and requests for more than the graph's
+        ``KNN_GRAPH_NEIGHBORS``, search the index with the stored vector
+        instead. Returns None if the product is not indexed or no longer in
+        the database.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        
+        product_id = str(product_id)
+        graph = snapshot.knn_graph
+        removed = snapshot.index.removed
+        row = graph.row_of(snapshot.product_ids, product_id) if graph is not None else -1
+        
+        if row >= 0 and not removed[row] and top_n <= graph.k:
+            rows, scores = graph.lookup(row, top_n, removed)
+        else:
+            if row < 0 or removed[row]:
+                row = snapshot.ungraphed_rows.get(product_id, -1)
+            if row < 0:
+                return None
+            rows, scores = snapshot.index.search(snapshot.index.take([row])[0], top_n + 1)
+            keep = rows != row
+            rows, scores = rows[keep][:top_n], scores[keep][:top_n]
+        
+        product = self.db.products.find_one({"_id": self._to_object_id(product_id)})
+        if product is None:
+            return None
+        
+        hits = [
+            (str(snapshot.product_ids[r]), float(similarity))
+            for r, similarity in zip(rows, scores) if similarity > 0.1
+        ]
+        return product, self._hydrate_hits(hits, product)
     
-    def _get_fallback_similar_products(self, input_product: Dict, top_n: int) -> List[Dict]:
+    def _get_fallback_similar_products(self, input_product: Dict, top_n: int,
+                                       filters: Dict[str, Any] = None) -> List[Dict]:
         """Fallback method when ML models fail"""
         print("🔄 Using fallback similar products method...")
         
+        filters = active_filters(filters)
+        query = {"category": self._loose_match(filters.get('category', input_product['category']))}
+        for field in ('brand', 'target_audience'):
+            if field in filters:
+                query[field] = self._loose_match(filters[field])
+        price_range = {}
+        if 'min_price' in filters:
+            price_range["$gte"] = float(filters['min_price'])
+        if 'max_price' in filters:
+            price_range["$lte"] = float(filters['max_price'])
+        if price_range:
+            query["price"] = price_range
+        
         # Get some random products from the database as fallback
-        products = list(self.db.products.find({
-            "category": input_product['category']
-        }).limit(top_n))
+        products = list(self.db.products.find(query).limit(top_n))
+        
+        stats_by_id = self.get_products_marketing_stats(products)
         
         similar_products = []
         for product in products:
@@ -307,44 +961,56 @@ class AdvancedMarketingRecommender:
                 similar_products.append({
                     'product': product,
                     'similarity': 0.7,  # Default similarity
-                    'marketing_stats': self.get_product_marketing_stats(str(product['_id'])),
+                    'marketing_stats': stats_by_id[product['_id']],
                     'shared_features': [input_product['category']]
                 })
         
         return similar_products[:top_n]
     
-    def get_product_marketing_stats(self, product_id: str) -> Dict:
-        """Get marketing performance statistics for a product"""
-        scripts = list(self.db.scripts.find({"product_id": product_id}))
-        
-        if not scripts:
-            return {
-                "avg_performance": 6.0, 
-                "best_platform": "Instagram", 
-                "script_count": 0,
-                "top_performing_script": None
-            }
-        
-        performances = [s.get('performance_score', 6.0) for s in scripts]
-        platforms = [s.get('platform', 'Instagram') for s in scripts]
-        
-        # Find best performing platform
-        platform_scores = {}
-        for script in scripts:
-            platform = script.get('platform', 'Instagram')
-            score = script.get('performance_score', 6.0)
-            if platform not in platform_scores:
-                platform_scores[platform] = []
-            platform_scores[platform].append(score)
-        
-        best_platform = max(platform_scores.items(), key=lambda x: np.mean(x[1]))[0] if platform_scores else "Instagram"
+    @staticmethod
+    def _loose_match(value) -> Dict:
+        """Mongo condition matching ``value`` as ProductMetadata filters do: ignoring case and extra whitespace"""
+        pattern = r"\s+".join(re.escape(word) for word in str(value).split())
+        return {"$regex": rf"^\s*{pattern}\s*$", "$options": "i"}
+    
+    @staticmethod
+    def _to_object_id(product_id):
+        """Convert a stored string id back to the ObjectId used as ``_id``"""
+        if isinstance(product_id, str) and ObjectId.is_valid(product_id):
+            return ObjectId(product_id)
+        return product_id
+    
+    def _aggregate_marketing_stats(self, script_keys: List) -> Dict:
+        """Look up marketing stats for many script ``product_id`` values at once"""
+        if self.stats_materialized:
+            return marketing_stats.load_marketing_stats(self.db, script_keys)
+        return marketing_stats.compute_marketing_stats(self.db, script_keys)
+    
+    def get_products_marketing_stats(self, products: List[Dict]) -> Dict:
+        """Get marketing performance statistics for several products, keyed by ``_id``
         
-        return {
-            "avg_performance": float(np.mean(performances)),
-            "best_platform": best_platform,
-            "script_count": len(scripts),
-            "top_performing_script": max(scripts, key=lambda x: x.get('performance_score', 0)) if scripts else None
-        }
+        Scripts reference products through the catalog ``product_id`` field;
+        the stringified ``_id`` is also matched for scripts created in-app.
+        """
+        keys_by_id = {}
+        for product in products:
+            keys = [str(product['_id'])]
+            if product.get('product_id') is not None:
+                keys.append(product['product_id'])
+            keys_by_id[product['_id']] = keys
+        
+        stats = self._aggregate_marketing_stats([k for keys in keys_by_id.values() for k in keys])
+        
+        result = {}
+        for object_id, keys in keys_by_id.items():
+            matched = next((stats[k] for k in keys if k in stats), None)
+            result[object_id] = matched or marketing_stats.default_stats()
+        return result
+    
+    def get_product_marketing_stats(self, product_id) -> Dict:
+        """Get marketing performance statistics for a product"""
+        stats = self._aggregate_marketing_stats([product_id])
+        return stats.get(product_id, marketing_stats.default_stats())
 
     def find_shared_features(self, product1: Dict, product2: Dict) -> List[str]:
         """Find shared features between two products"""
@@ -360,7 +1026,7 @@ class AdvancedMarketingRecommender:
         category = input_product['category']
         
         # Get category-specific patterns
-        category_pattern = self.category_patterns.get(category, {})
+        category_pattern = self.current_patterns().get(category, {})
         
         # If no specific patterns for this category, use general successful patterns
         if not category_pattern:
@@ -542,7 +1208,7 @@ class AdvancedMarketingRecommender:
             guidelines['storytelling_elements'] = ['before-after', 'scientific backing', 'user testimonials']
         
         # Add product-specific focus points
-        price = product.get('price', 0)
+        price = product.get('price') or 0
         if price > 200:
             guidelines['focus_points'].append('premium quality')
             guidelines['emotional_appeals'].append('exclusivity')
@@ -783,7 +1449,7 @@ What makes it special?
         
         # Adjust based on category performance
         category = product['category']
-        category_pattern = self.recommender.category_patterns.get(category, {})
+        category_pattern = self.recommender.current_patterns().get(category, {})
         if category_pattern:
             avg_tone_score = np.mean(list(category_pattern.get('best_tones', {}).values()))
             base_score += (avg_tone_score - 7.0) * 0.1
@@ -793,7 +1459,7 @@ What makes it special?
         if feature_count > 10:
             base_score += 0.5
         
-        price = product.get('price', 0)
+        price = product.get('price') or 0
         if 50 <= price <= 200:  # Sweet spot for impulse purchases
             base_score += 0.3
         
@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+
+# Fields matched case-insensitively downstream, so their case never changes the response;
+# everything else (name, description, ...) is echoed back and keeps its case
+CASE_INSENSITIVE_FIELDS = frozenset({"category", "brand", "target_audience"})
+
+
+def _normalize(field: str, value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return {name: _normalize(name, nested) for name, nested in value.items()}
+    text = " ".join(str(value).split())
+    return text.lower() if field in CASE_INSENSITIVE_FIELDS else text
+
+
+def request_key(payload: Dict[str, Any], version: str = None) -> str:
+    """Stable key for a request: whitespace-insensitive, field-order independent, and
+    case-insensitive only in the fields listed in ``CASE_INSENSITIVE_FIELDS``"""
+    normalized = {field: _normalize(field, value) for field, value in payload.items()}
+    raw = json.dumps({"version": version, "request": normalized}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU cache for computed responses with single-flight deduplication
+
+    Concurrent requests for the same key share one computation, which keeps
+    running for the remaining waiters if the request that started it is
+    cancelled; failures are propagated to every waiter and never cached.
+    ``clear`` may be called from any thread (e.g. when a retrain finishes).
+    """
+
+    def __init__(self, max_items: int = 1024, ttl_seconds: float = 600):
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key`` or compute it once for all concurrent callers"""
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A detached task: cancelling the caller that started it must not cancel it for the others
+            pending = asyncio.ensure_future(compute())
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda task: self._finish(key, task))
+        return await asyncio.shield(pending)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        """Store a successful computation; runs before any waiter resumes"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Reading the exception also marks it retrieved when every waiter was cancelled
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            items = len(self._entries)
+        return {
+            "items": items,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, Iterator, List
+
+from config import Config
+from src import catalog_snapshot
+from src.product_metadata import METADATA_FIELDS
+
+# Fields each training stage reads; everything else (notably the long script
+# ``content``) is never transferred. Similarity training also keeps the
+# filter columns (brand, price, audience) stored next to the vectors.
+SIMILARITY_PRODUCT_FIELDS = list(dict.fromkeys(['name', 'category', 'description', 'extracted_features'] + METADATA_FIELDS))
+PATTERN_PRODUCT_FIELDS = ['product_id', 'category']
+PATTERN_SCRIPT_FIELDS = ['product_id', 'tone', 'platform', 'content_structure', 'performance_score', 'keywords']
+
+TRAINING_PRODUCT_FIELDS = list(dict.fromkeys(SIMILARITY_PRODUCT_FIELDS + PATTERN_PRODUCT_FIELDS))
+
+
+class TrainingDataSource:
+    """Streams the training fields of products and scripts from the snapshot or Mongo
+
+    Snapshots are refreshed at most once per source, so a training run that
+    creates one source reads each collection exactly once. Rows are always
+    yielded as dicts with ``_id``, mirroring projected Mongo documents.
+    """
+
+    def __init__(self, db, source: str = None, batch_size: int = None):
+        self.db = db
+        self.batch_size = batch_size or Config.TRAINING_BATCH_SIZE
+        source = source or Config.TRAINING_SOURCE
+        if source == "snapshot" and not catalog_snapshot.snapshots_available():
+            print("⚠️  pyarrow not installed. Reading training data from MongoDB...")
+            source = "mongo"
+        self.source = source
+        self._refreshed = set()
+
+    def _rows(self, name: str, fields: List[str]) -> Iterator[Dict]:
+        if self.source == "snapshot":
+            if name not in self._refreshed:
+                catalog_snapshot.refresh_snapshot(self.db, name)
+                self._refreshed.add(name)
+            yield from catalog_snapshot.iter_snapshot_rows(
+                name, batch_size=self.batch_size, columns=['_id'] + fields
+            )
+        else:
+            projection = {field: 1 for field in fields}
+            yield from self.db[name].find({}, projection).batch_size(self.batch_size)
+
+    def products(self, fields: List[str] = None) -> Iterator[Dict]:
+        return self._rows('products', fields or TRAINING_PRODUCT_FIELDS)
+
+    def scripts(self, fields: List[str] = None) -> Iterator[Dict]:
+        return self._rows('scripts', fields or PATTERN_SCRIPT_FIELDS)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src import pattern_mining
+
+
+def test_scripts_frame_with_int_and_missing_product_ids():
+    lookup = pattern_mining.build_category_lookup([
+        {'_id': 'a1', 'product_id': 1, 'category': 'Shoes'},
+        {'_id': 'a2', 'product_id': 2, 'category': 'Laptop'},
+    ])
+    scripts = [
+        {'product_id': 1, 'tone': 'casual', 'performance_score': 8.0},
+        {'product_id': None, 'tone': 'professional'},
+        {'product_id': 2, 'platform': 'Email'},
+        {'tone': 'urgent'},
+    ]
+
+    df = pattern_mining.scripts_frame(scripts, lookup)
+
+    assert df['product_id'].tolist() == ['1', '2']
+    assert df['category'].tolist() == ['Shoes', 'Laptop']
+
+
+def test_scripts_frame_matches_stringified_object_ids():
+    lookup = pattern_mining.build_category_lookup([{'_id': 'a1', 'category': 'Shoes'}])
+
+    df = pattern_mining.scripts_frame([{'product_id': 'a1'}, {'product_id': None}], lookup)
+
+    assert df['category'].tolist() == ['Shoes']
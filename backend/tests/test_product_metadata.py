@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.product_metadata import ProductMetadata
+
+
+def test_price_bounds_include_products_priced_at_the_bound():
+    metadata = ProductMetadata.from_products([
+        {'category': 'Shoes', 'price': 19.99},
+        {'category': 'Shoes', 'price': 25.5},
+        {'category': 'Shoes', 'price': None},
+    ])
+
+    assert metadata.select({'min_price': 19.99}).tolist() == [0, 1]
+    assert metadata.select({'max_price': 19.99}).tolist() == [0]
+    assert metadata.select({'min_price': 19.99, 'max_price': 19.99}).tolist() == [0]
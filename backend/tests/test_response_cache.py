@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.response_cache import ResponseCache, request_key
+
+
+def test_request_key_keeps_case_of_echoed_fields():
+    base = {"name": "Nike Air", "category": "Shoes", "description": "Light runner"}
+
+    assert request_key(base, "v1") != request_key({**base, "name": "nike air"}, "v1")
+    assert request_key(base, "v1") != request_key({**base, "description": "light runner"}, "v1")
+
+
+def test_request_key_ignores_whitespace_and_case_of_matched_fields():
+    base = {"name": "Nike Air", "category": "Shoes", "target_audience": "Runners",
+            "filters": {"brand": "Nike", "min_price": 10.0}}
+    variant = {"name": " Nike  Air ", "category": "SHOES", "target_audience": "runners",
+               "filters": {"brand": "nike", "min_price": 10.0}}
+
+    assert request_key(base, "v1") == request_key(variant, "v1")
+    assert request_key(base, "v1") != request_key(base, "v2")
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def scenario():
+        cache = ResponseCache()
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return {"strategy": "ok"}
+
+        leader = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await waiter == {"strategy": "ok"}
+        assert leader.cancelled()
+        assert await cache.get_or_compute("key", compute) == {"strategy": "ok"}
+        assert len(calls) == 1
+        assert cache.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache = ResponseCache()
+
+        async def compute():
+            await asyncio.sleep(0)
+            raise ValueError("model unavailable")
+
+        results = await asyncio.gather(
+            cache.get_or_compute("key", compute), cache.get_or_compute("key", compute),
+            return_exceptions=True
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert cache.stats()["items"] == 0
+
+    asyncio.run(scenario())
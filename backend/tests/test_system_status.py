@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Fail the startup ping fast instead of waiting on a server that is not there
+os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100")
+
+import main
+
+
+class FakeCollection:
+    def __init__(self, count, categories):
+        self.count = count
+        self.categories = categories
+
+    def count_documents(self, query):
+        return self.count
+
+    def distinct(self, field):
+        return self.categories
+
+
+class FakeDatabase:
+    """Like pymongo's Database, truth-testing is an error"""
+
+    def __init__(self):
+        self.products = FakeCollection(3, ["Shoes", "Laptop"])
+        self.scripts = FakeCollection(5, [])
+
+    def __bool__(self):
+        raise NotImplementedError("Database objects do not implement truth value testing")
+
+
+def test_system_status_with_database(monkeypatch):
+    monkeypatch.setattr(main, "db", FakeDatabase())
+    monkeypatch.setattr(main, "db_connected", True)
+
+    response = TestClient(main.app).get("/api/system/status")
+
+    assert response.status_code == 200
+    database = response.json()["database"]
+    assert database["product_count"] == 3
+    assert database["script_count"] == 5
+    assert database["categories_covered"] == 2
+
+
+def test_system_status_without_database(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    monkeypatch.setattr(main, "db_connected", False)
+
+    response = TestClient(main.app).get("/api/system/status")
+
+    assert response.status_code == 200
+    assert response.json()["database"]["product_count"] == 0